@@ -5,7 +5,7 @@ import streamlit as st
 import logging
 from datetime import datetime
 
-from modules import EDA_frontend, data_preprocessing, gcs
+from modules import EDA_frontend, data_preprocessing, gcs, parallel, shared_data
 from modules.logger import (
     init_logger,
     upload_log_to_gcs,
@@ -96,6 +96,19 @@ def header_cols(path):
         logger.error("Failed to get headers from %s: %s", path, e)
         return []
 
+@st.cache_data(show_spinner=False)
+def source_headers():
+    """Raw column lists saved by the pipeline; falls back to opening the workbooks."""
+    try:
+        h = data_preprocessing.load_source_headers()
+        return h["production"], h["issues"], h["demand"]
+    except Exception as e:
+        logger.info("No stored source headers (%s); reading workbook headers.", e)
+        return tuple(
+            header_cols(p)
+            for p in (config.production_filepath, config.issues_filepath, config.demand_filepath)
+        )
+
 def make_style(prod, iss, dem, eng):
     def _styler(col):
         if   col.name in prod: c = COLOR_MAP["production"]
@@ -123,10 +136,7 @@ def legend_html():
 
 def show_preview(df):
     try:
-        prod, iss, dem = (
-            header_cols(p)
-            for p in (config.production_filepath, config.issues_filepath, config.demand_filepath)
-        )
+        prod, iss, dem = source_headers()
         eng = [c for c in df.columns if c not in set(prod + iss + dem)]
 
         styled = (
@@ -157,16 +167,32 @@ PLOT_TASKS = [
 
 def ensure_plots(df):
     try:
-        to_run = [(pth, fn) for pth, fn in PLOT_TASKS if not os.path.exists(pth)]
+        fingerprint = shared_data.data_key()
+        manifest = EDA_frontend.load_plot_manifest()
+        to_run = EDA_frontend.stale_plots(PLOT_TASKS, fingerprint, manifest)
         if not to_run:
-            logger.info("All EDA plots already exist.")
+            logger.info("All EDA plots are up to date.")
+            st.session_state["plots_done"] = True
             return
 
         with st.spinner("Generating EDA plots…"):
-            for pth, fn in to_run:
-                os.makedirs(os.path.dirname(pth), exist_ok=True)
-                fn(df)
+            # render in worker processes, upload each PNG as soon as it is ready
+            results = parallel.render_and_store(
+                [(fn, (df,), {}) for _, fn in to_run], config.local_eda_flag
+            )
+
+        failed = []
+        for (pth, fn), res in zip(to_run, results):
+            if isinstance(res, Exception):
+                failed.append(pth)
+                logger.error("Failed to generate EDA plot %s: %s", pth, res)
+            else:
+                EDA_frontend.record_plot(manifest, pth, fn, fingerprint)
                 logger.info("Generated and saved EDA plot: %s", pth)
+        EDA_frontend.save_plot_manifest(manifest)
+        if failed:
+            st.error("Failed to generate EDA plots.")
+            return
 
         st.toast("EDA frontend plots saved.", icon="✅")
         st.session_state["plots_done"] = True
@@ -180,7 +206,7 @@ def ensure_plots(df):
 try:
     with st.expander(
         "📂 Upload / replace raw data (Issues, Production, Demand)",
-        expanded=("cleaned_df" not in st.session_state),
+        expanded=("data_version" not in st.session_state),
     ):
         with st.form("uploader"):
             uploads = st.file_uploader(
@@ -189,6 +215,14 @@ try:
                 accept_multiple_files=True,
                 key="up1",
             )
+            incremental = st.radio(
+                "Processing",
+                ["Replace all data", "Add new / changed shifts only"],
+                index=1 if config.incremental_preprocessing else 0,
+                help="Incremental processing keeps stored shifts that are missing "
+                     "from the uploaded files; replace to delete or correct rows.",
+                horizontal=True,
+            ) != "Replace all data"
             submitted = st.form_submit_button("Save & Process")
 
         if submitted:
@@ -202,7 +236,8 @@ try:
 
             with st.spinner("Running preprocessing pipeline…"):
                 try:
-                    data_preprocessing.preprocess_and_save()
+                    data_preprocessing.preprocess_and_save(incremental=incremental)
+                    source_headers.clear()
                     logger.info("Data preprocessing completed.")
                 except Exception as e:
                     logger.error("Preprocessing failed: %s", e)
@@ -210,9 +245,9 @@ try:
                     st.stop()
 
             try:
-                st.session_state.cleaned_df = gcs.load_dataframe(
-                    config.cleaned_path, config.local_data_flag
-                )
+                # new upload supersedes the shared dataset for every session
+                shared_data.invalidate()
+                st.session_state.data_version = shared_data.version()
                 logger.info("Loaded cleaned dataframe from storage.")
             except Exception as e:
                 logger.error("Loading cleaned data failed: %s", e)
@@ -230,11 +265,12 @@ except Exception as e:
 # 5.  Preview + plot generation
 # ─────────────────────────────────────────────────────────────
 try:
-    if "cleaned_df" in st.session_state:
-        show_preview(st.session_state.cleaned_df)
+    if "data_version" in st.session_state:
+        cleaned_df = shared_data.cleaned_dataframe()
+        show_preview(cleaned_df)
 
         if not st.session_state.get("plots_done"):
-            ensure_plots(st.session_state.cleaned_df)
+            ensure_plots(cleaned_df)
     else:
         st.info("Upload raw files above and click **Save & Process** to begin.")
 except Exception as e:
@@ -2,29 +2,69 @@
 issues_filepath = "Data/Source_Data/Issues_Data/Issues_downtime_rawmaterial_data.xlsx"
 production_filepath = "Data/Source_Data/Issues_Data/Production_data.xlsx"
 demand_filepath = "Data/Source_Data/Issues_Data/Demand_data.xlsx"
-cleaned_path = "Data/Final_Data/Cleaned_Data/cleaned_data.csv"
-merged_data_filepath = "Data/Source_Data/Merged_Data/merged_data.csv"
+cleaned_path = "Data/Final_Data/Cleaned_Data/cleaned_data.parquet"
+merged_data_filepath = "Data/Source_Data/Merged_Data/merged_data.parquet"
 linewise_pivot_data_filepath = "Data/Final_Data/Data_For_AI/linewise_pivot_data.csv"
+source_headers_filepath = "Data/Final_Data/Cleaned_Data/source_headers.json"
+ingest_state_filepath = "Data/Final_Data/Cleaned_Data/ingest_state.parquet"
+line_aggregates_filepath = "Data/Final_Data/Data_For_AI/linewise_running_aggregates.parquet"
+dashboard_downtime_filepath = "Data/Final_Data/Data_For_AI/dashboard_downtime_by_shift_issue.parquet"
+dashboard_production_filepath = "Data/Final_Data/Data_For_AI/dashboard_production_vs_downtime.parquet"
 ocr_production_saved_path = "Data/OCR_Data/Production_OCR.csv"
 ocr_issues_saved_path = "Data/OCR_Data/Issues_OCR.csv"
 production_plan_filepath = "Data/Reported_plans/Production_plan.csv"
 line_summary_filepath = "Data/Reported_plans/line_summary_plan.csv"
 
+# Dataframe storage (format is picked from the file extension in modules/gcs)
+parquet_compression = "zstd"
+parquet_row_group_size = 50_000
+feather_compression = "zstd"
+
 # EDA local plots saved path
 utilization_fulfillment_plot_saved_path = 'EDA_plots/Frontend_Plots/Utilization_Fulfillment/linewise_utilization_fulfillment_downtime.png'
 downtime_distribution_plot_saved_path = 'EDA_plots/Frontend_Plots/Downtime_distribution/linewise_issue_downtime.png'
 issues_timeline_plot_saved_path = 'EDA_plots/Frontend_Plots/Issues_Timeline/issues_timeline_by_line.png'
 production_downtime_saved_path = 'EDA_plots/Frontend_Plots/Production_vs_Downtime/prod_downtime_issues_by_line_shift.png'
 combined_production_rm_saved_path = 'EDA_plots/Frontend_Plots/Inventory_Shortages/Combined_Production_RawMaterial_Shortages.png'
+eda_plot_manifest_path = 'EDA_plots/Frontend_Plots/plot_manifest.json'
 
 ## EDA local backend files
 line1_combined_analysis_path = "EDA_plots/Backend_Plots/Line1/line1_combined_analysis.png"
 line2_combined_analysis_path = "EDA_plots/Backend_Plots/Line2/line2_combined_analysis.png"
 line3_combined_analysis_path = "EDA_plots/Backend_Plots/Line3/line3_combined_analysis.png"
+backend_figure_cache_dir = "EDA_plots/Backend_Plots/Cache"
+
+# Figure rendering profiles: resolution / format per consumer.
+# max_px caps the longest side (dpi is lowered to fit); quality applies to
+# lossy formats only.
+RENDER_PROFILES = {
+    "screen":    {"dpi": 110, "format": "png",  "max_px": 2400},
+    "llm":       {"dpi": 100, "format": "webp", "max_px": 2048, "quality": 85},
+}
+frontend_plot_profile = "screen"
+backend_plot_profile = "llm"
+
+# Plotly dashboard: line traces above plot_max_points are min/max downsampled,
+# traces above plot_webgl_threshold points are drawn with WebGL
+plot_max_points = 5_000
+plot_webgl_threshold = 1_000
+
+# Process-wide shared cleaned dataset: how often to check storage for a new version
+shared_data_check_seconds = 30
+
+# Parallel figure rendering (matplotlib is not thread-safe, so processes)
+render_workers = None            # None → one per CPU
+render_start_method = "spawn"    # avoid forking the threaded Streamlit server
 
 # GCS bucket details
 GCS_BUCKET_NAME = "terasaka_demo_bucket"
 
+# Local disk cache in front of GCS reads
+gcs_cache_enabled = True
+gcs_cache_dir = "/tmp/gcs_cache"
+gcs_cache_max_bytes = 512 * 1024 * 1024
+gcs_cache_ttl_seconds = 30
+
 # Flags
 local_data_flag = False
 local_eda_flag = False
@@ -33,11 +73,35 @@ local_log_flag = False
 local_ocr_flag = False
 line_summary_flag = False
 production_plan_flag = False
+incremental_preprocessing = False
+parse_sources_in_processes = False
+persist_merged_data = True
+persist_merged_async = True
 ## Model
 USE_OPENAI = True
 huggingface_model = "google/gemma-3-27b-it"
 hugging_face_temperature=0.0
 gpt_model = "gpt-4.1-mini"
+llm_max_concurrency = 3          # LLM requests (plot analyses, report text) sent at once
+llm_request_timeout = 120        # seconds per LLM request
+stream_report = True             # render the report markdown while it streams (foreground only)
+
+# Background report jobs (modules/jobs): on-disk job table + worker processes.
+# Default for the page checkbox; background reports survive leaving the page
+# but are not streamed (stream_report only applies to foreground runs).
+report_background_jobs = True
+report_jobs_db = "/tmp/report_jobs/jobs.sqlite3"
+report_workers = 1
+report_job_poll_seconds = 2
+report_worker_idle_seconds = 600
+report_worker_stale_seconds = 30
+report_batch_threads = 16        # task-graph threads for batch report generation
+
+# Local cache of LLM responses (model + temperature + prompt + image digests)
+llm_cache_enabled = True
+llm_cache_path = "/tmp/llm_cache/responses.sqlite3"
+llm_cache_ttl_seconds = 7 * 24 * 3600
+llm_cache_max_bytes = 64 * 1024 * 1024
 ocr_model = "gemini-1.5-flash"
 
 
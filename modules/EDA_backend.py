@@ -1,9 +1,13 @@
+import json
+import logging
+import hashlib
+import inspect
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib.dates as mdates
 from datetime import timedelta
-from modules import gcs
+from modules import gcs, schema, partitions, parallel
 import config
 from matplotlib.gridspec import GridSpec
 
@@ -22,9 +26,9 @@ def create_combined_linewise_figure(df, line, save_path, date, shift):
         ax.set_xticklabels([d.strftime('%Y-%m-%d') for d in ticks], rotation=90, ha='center')
 
     cutoff_date = pd.to_datetime(date)
-    df = df.copy()
-    df['Date'] = pd.to_datetime(df['Date'])
-    line_df = df[df['Production Line'] == line]
+    # slice first, so only this line's rows are copied
+    line_df = partitions.rows(df, 'Production Line', line)
+    line_df['Date'] = pd.to_datetime(line_df['Date'])
 
     # Filtering: only selected shift on cutoff, all shifts after
     selected_shift = shift
@@ -38,7 +42,8 @@ def create_combined_linewise_figure(df, line, save_path, date, shift):
     # --- Box Plot (Filtered Data) ---
     ax1 = fig.add_subplot(gs[0, :])
     box_df = filtered_df[(filtered_df['Date'] >= cutoff_date)]
-    sns.boxplot(x='Issue Severity', y='Total Downtime (hrs)', data=box_df, palette='pastel', ax=ax1)
+    sns.boxplot(x='Issue Severity', y='Total Downtime (hrs)', data=box_df,
+                order=list(box_df['Issue Severity'].dropna().unique()), palette='pastel', ax=ax1)
     ax1.set_title(f'{line} – Severity vs Downtime ({selected_shift} Shift)', fontsize=12)
     ax1.set_ylabel('Total Downtime (hrs)')
 
@@ -51,7 +56,7 @@ def create_combined_linewise_figure(df, line, save_path, date, shift):
     ax2.plot(sorted_df['Date'], sorted_df['Downtime - Raw Material (hrs)'] * 1000, '--', label='Downtime (×1000)', color='tab:red')
     ax2_2.plot(sorted_df['Date'], sorted_df['Actual Production (units)'], label='Production', color='tab:green')
 
-    shortage = sorted_df[sorted_df['Raw Material Availability'].str.contains('Shortage', na=False)]
+    shortage = sorted_df[schema.is_shortage(sorted_df)]
     ax2_2.scatter(shortage['Date'], shortage['Actual Production (units)'], color='orange', marker='x', s=80, label='Shortage')
 
     max_date = sorted_df['Date'].max()
@@ -77,7 +82,7 @@ def create_combined_linewise_figure(df, line, save_path, date, shift):
     # --- Heatmap (Filtered Data) ---
     ax_heat = fig.add_subplot(gs[1, 1])
     heat_df = filtered_df[filtered_df['Date'] >= cutoff_date]
-    pivot = heat_df.pivot_table(index='Shift', columns='Issue Type', values='Total Downtime (hrs)', aggfunc='sum', fill_value=0)
+    pivot = heat_df.pivot_table(index='Shift', columns='Issue Type', values='Total Downtime (hrs)', aggfunc='sum', fill_value=0, observed=True)
 
     if pivot.empty or pivot.values.sum() == 0:
         dummy = pd.DataFrame([[0]], index=[f'{selected_shift} Shift'], columns=['No Issues'])
@@ -88,11 +93,9 @@ def create_combined_linewise_figure(df, line, save_path, date, shift):
         ax_heat.set_title(f'{line} – {selected_shift} Shift Issue Downtime', fontsize=11)
 
     # --- Per-Shift Trend Plots (Full Data) ---
-    shifts = line_df['Shift'].dropna().unique()
-    for j, shift in enumerate(shifts):
+    for j, (shift, sub) in enumerate(partitions.split(line_df, 'Shift').items()):
         ax3 = fig.add_subplot(gs[2, j])
-        sub = line_df[line_df['Shift'] == shift].copy()
-        sub_agg = sub.groupby('Date', as_index=False).agg({
+        sub_agg = sub.groupby('Date', as_index=False, observed=True).agg({
             'Machine Operation Time (hrs)': 'sum',
             'Total Downtime (hrs)': 'sum',
             'Issue Type': lambda x: ', '.join(sorted(set(i for i in x if pd.notna(i))))
@@ -123,5 +126,70 @@ def create_combined_linewise_figure(df, line, save_path, date, shift):
         if j == 0:
             ax3.legend(loc='upper left')
 
-    gcs.smart_savefig(fig, save_path, config.local_eda_flag, dpi=300, bbox_inches='tight')
-    plt.close(fig)
\ No newline at end of file
+    gcs.smart_savefig(fig, save_path, config.local_eda_flag, profile=config.backend_plot_profile, bbox_inches='tight')
+    plt.close(fig)
+
+
+# Changes to the plotting code or its render profile invalidate every cached figure
+FIGURE_CODE_VERSION = hashlib.sha256(
+    inspect.getsource(create_combined_linewise_figure).encode("utf-8")
+    + json.dumps(config.RENDER_PROFILES[config.backend_plot_profile], sort_keys=True).encode("utf-8")
+).hexdigest()[:12]
+
+def figure_cache_key(line_df, line, date, shift):
+    """Content hash of everything the combined figure depends on."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(line_df, index=False).values.tobytes())
+    h.update("|".join(map(str, line_df.columns)).encode("utf-8"))
+    h.update(f"{line}|{pd.to_datetime(date).date()}|{shift}|{FIGURE_CODE_VERSION}".encode("utf-8"))
+    return h.hexdigest()[:32]
+
+def _figure_cache_path(line, key):
+    return gcs.profile_path(f"{config.backend_figure_cache_dir}/{line}/{key}.png", config.backend_plot_profile)
+
+def create_combined_linewise_figures(df, save_paths, date, shift, use_cache=True):
+    """Render the combined figure for several lines at once in worker processes.
+
+    ``save_paths`` maps line → storage path; ``None`` stores the figure only
+    at its content-addressed cache path (used by batch reports, so no
+    per-cutoff copies pile up). Each worker only receives its own line's
+    rows. Figures whose inputs (line rows, date, shift, plotting code) match
+    a previous run are copied from the figure cache instead of being rendered
+    and uploaded again. Returns ``{line: (path, image_bytes)}``, with the
+    exception instead of the tuple for lines whose figure failed.
+    """
+    logger = logging.getLogger("manufacturing_logger")
+    out, jobs, cache_paths = {}, [], {}
+    for line, save_path in save_paths.items():
+        line_df = partitions.rows(df, 'Production Line', line)
+        cache_path = cache_paths[line] = _figure_cache_path(
+            line, figure_cache_key(line_df, line, date, shift))
+        if save_path is None:
+            save_path = cache_path
+        else:
+            save_path = gcs.profile_path(save_path, config.backend_plot_profile)
+        if use_cache or save_path == cache_path:
+            try:
+                content = gcs.read_bytes(cache_path, config.local_eda_flag)
+                if save_path != cache_path:
+                    gcs.copy(cache_path, save_path, config.local_eda_flag)
+                out[line] = (save_path, content)
+                continue
+            except FileNotFoundError:
+                pass
+        jobs.append((line, (create_combined_linewise_figure, (line_df, line, save_path, date, shift), {})))
+
+    results = parallel.render_and_store([job for _, job in jobs], config.local_eda_flag) if jobs else []
+    for (line, _), res in zip(jobs, results):
+        if isinstance(res, Exception):
+            out[line] = res
+            continue
+        out[line] = res[0]
+        if use_cache and res[0][0] != cache_paths[line]:
+            try:
+                gcs.copy(res[0][0], cache_paths[line], config.local_eda_flag)
+            except Exception as e:
+                logger.warning("Could not cache backend figure for %s: %s", line, e)
+
+    logger.info("Backend figures: %d from cache, %d rendered.", len(save_paths) - len(jobs), len(jobs))
+    return {line: out[line] for line in save_paths}
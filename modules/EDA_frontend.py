@@ -1,8 +1,11 @@
+import json
+import hashlib
+import inspect
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.lines import Line2D
-from modules import gcs
+from modules import gcs, schema, partitions
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -10,22 +13,57 @@ import config
 
 
 def load_cleaned_data():
-    cleaned_df = pd.read_csv(config.cleaned_path)
-    # Ensure 'Date' is datetime
-    cleaned_df['Date'] = pd.to_datetime(cleaned_df['Date'])
-    return cleaned_df
+    return schema.load_cleaned_dataframe()
+
+# =============== PLOT MANIFEST ===============
+# Records, for every stored plot, the data fingerprint and plotting-code
+# version it was rendered from, so plots are regenerated exactly when one
+# of them changes – in local and GCS storage alike.
+
+def plot_version(fn):
+    """Hash of the plotting code and the render profile it is saved with."""
+    h = hashlib.sha256(inspect.getsource(fn).encode("utf-8"))
+    h.update(json.dumps(config.RENDER_PROFILES[config.frontend_plot_profile], sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+def load_plot_manifest():
+    try:
+        return json.loads(gcs.read_bytes(config.eda_plot_manifest_path, config.local_eda_flag))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_plot_manifest(manifest):
+    gcs.write_bytes(json.dumps(manifest, indent=2).encode("utf-8"), config.eda_plot_manifest_path,
+                    config.local_eda_flag, content_type="application/json")
+
+def stale_plots(tasks, data_fingerprint, manifest):
+    """The ``(path, fn)`` tasks whose stored plot is missing or out of date."""
+    stale = []
+    for path, fn in tasks:
+        entry = manifest.get(path, {})
+        current = (entry.get("fingerprint") == data_fingerprint
+                   and entry.get("version") == plot_version(fn))
+        stored = gcs.profile_path(path, config.frontend_plot_profile)
+        if not current or not gcs.exists(stored, config.local_eda_flag):
+            stale.append((path, fn))
+    return stale
+
+def record_plot(manifest, path, fn, data_fingerprint):
+    manifest[path] = {
+        "function": fn.__name__,
+        "version": plot_version(fn),
+        "fingerprint": data_fingerprint,
+    }
 
 def plot_utilization_fulfillment_rate(df):
-    lines = df['Production Line'].unique()
-    n = len(lines)
+    line_parts = partitions.by_line(df)
+    n = len(line_parts)
 
     fig, axes = plt.subplots(n, 2, figsize=(15, 5 * n), sharex=False)
     if n == 1:
         axes = axes.reshape(1, -1)
 
-    for i, line in enumerate(lines):
-        sub = df[df['Production Line'] == line]
-
+    for i, (line, sub) in enumerate(line_parts.items()):
         # 1. Utilization vs Shift (Box + Strip)
         ax = axes[i, 0]
         sns.boxplot(
@@ -73,27 +111,26 @@ def plot_utilization_fulfillment_rate(df):
             lbl.set_rotation(45)
 
     plt.tight_layout()
-    gcs.smart_savefig(fig, config.utilization_fulfillment_plot_saved_path,config.local_eda_flag, dpi=300)
+    gcs.smart_savefig(fig, config.utilization_fulfillment_plot_saved_path,config.local_eda_flag, profile=config.frontend_plot_profile)
 
 
 def plot_downtime_distribution(df):
     # Identify unique production lines
-    lines = df['Production Line'].unique()
-    n = len(lines)
+    line_parts = partitions.by_line(df)
+    n = len(line_parts)
 
     # Create an n×3 grid of subplots
     fig, axes = plt.subplots(n, 3, figsize=(18, 6 * n), sharex=False)
     if n == 1:
         axes = axes.reshape(1, -1)  # keep 2D indexing even if only one line
 
-    for i, line in enumerate(lines):
-        sub = df[df['Production Line'] == line]
-
+    for i, (line, sub) in enumerate(line_parts.items()):
         # 1. Boxplot: Issue Severity vs Total Downtime
         sns.boxplot(
             x='Issue Severity',
             y='Total Downtime (hrs)',
             data=sub,
+            order=list(sub['Issue Severity'].dropna().unique()),
             palette='pastel',
             ax=axes[i, 0]
         )
@@ -103,7 +140,7 @@ def plot_downtime_distribution(df):
 
         # 2. Bar chart: Total Downtime by Issue Type
         downtime_by_type = (
-            sub.groupby('Issue Type')['Total Downtime (hrs)']
+            sub.groupby('Issue Type', observed=True)['Total Downtime (hrs)']
             .sum()
             .sort_values(ascending=False)
         )
@@ -124,7 +161,8 @@ def plot_downtime_distribution(df):
             columns='Issue Type',
             values='Total Downtime (hrs)',
             aggfunc='sum',
-            fill_value=0
+            fill_value=0,
+            observed=True
         )
         sns.heatmap(
             pivot,
@@ -140,14 +178,15 @@ def plot_downtime_distribution(df):
 
     # Tidy and save
     plt.tight_layout()
-    gcs.smart_savefig(fig, config.downtime_distribution_plot_saved_path,config.local_eda_flag, dpi=300)
+    gcs.smart_savefig(fig, config.downtime_distribution_plot_saved_path,config.local_eda_flag, profile=config.frontend_plot_profile)
 
 def plot_issues_over_time(df):
-    issues = df[df['Issue Severity'] != 'No Issue'][[
+    issues = df[schema.has_issue(df)][[
     'Date', 'Production Line', 'Issue Type', 'Downtime - Issues (hrs)']].copy()
 
     # 2. Unique lines & issue types, plus colormap
-    lines = issues['Production Line'].unique()
+    line_parts = partitions.by_line(issues)
+    lines = list(line_parts)
     issue_types = issues['Issue Type'].unique()
     cmap = plt.get_cmap('tab20')
     colors = {issue: cmap(i) for i, issue in enumerate(issue_types)}
@@ -158,10 +197,10 @@ def plot_issues_over_time(df):
                             figsize=(14, 4 * len(lines)))
 
     for ax, line in zip(axes, lines):
-        line_iss = issues[issues['Production Line'] == line]
+        by_issue = partitions.split(line_parts[line], 'Issue Type')
         for issue in issue_types:
-            sub = line_iss[line_iss['Issue Type'] == issue]
-            if sub.empty:
+            sub = by_issue.get(issue)
+            if sub is None:
                 continue
             ax.scatter(
                 sub['Date'],
@@ -196,7 +235,7 @@ def plot_issues_over_time(df):
     fig.suptitle('Issue Timelines by Production Line', fontsize=16)
     fig.autofmt_xdate()
     fig.tight_layout(rect=[0, 0, 0.85, 0.96])
-    gcs.smart_savefig(fig, config.issues_timeline_plot_saved_path,config.local_eda_flag, dpi=300)
+    gcs.smart_savefig(fig, config.issues_timeline_plot_saved_path,config.local_eda_flag, profile=config.frontend_plot_profile)
 
 def production_downtime_over_time(df):
     df['Date'] = pd.to_datetime(df['Date'])                            # [10]
@@ -207,7 +246,7 @@ def production_downtime_over_time(df):
 
     # 2. Aggregate per day/line/shift
     agg = (df_filtered
-        .groupby(['Date','Production Line','Shift'], dropna=False)
+        .groupby(['Date','Production Line','Shift'], dropna=False, observed=True)
         .agg({'Machine Operation Time (hrs)': 'sum',
                 'Total Downtime (hrs)': 'sum',
                 'Issue Type': lambda x: ', '.join(sorted(set(i for i in x if pd.notna(i))))})
@@ -216,6 +255,7 @@ def production_downtime_over_time(df):
     # 3. Setup subplot grid
     lines = agg['Production Line'].unique()
     shifts = agg['Shift'].unique()
+    cells = partitions.by_line_shift(agg)
     fig, axes = plt.subplots(len(lines), len(shifts),
                             sharex=True, figsize=(16, 4*len(lines)))
 
@@ -227,7 +267,7 @@ def production_downtime_over_time(df):
     for i, line in enumerate(lines):
         for j, shift in enumerate(shifts):
             ax = axes[i][j]
-            sub = agg[(agg['Production Line']==line) & (agg['Shift']==shift)]
+            sub = cells.get((line, shift), partitions.empty_like(agg))
             # Production trend
             ax.plot(sub['Date'], sub['Machine Operation Time (hrs)'],
                     color='tab:blue', label='Production Time (hrs)')
@@ -251,27 +291,27 @@ def production_downtime_over_time(df):
     fig.suptitle('Production Trend, Downtime & Issue Types by Line & Shift', fontsize=16)
     fig.autofmt_xdate()
     fig.tight_layout(rect=[0, 0, 1, 0.96])
-    gcs.smart_savefig(fig, config.production_downtime_saved_path,config.local_eda_flag, dpi = 300)
+    gcs.smart_savefig(fig, config.production_downtime_saved_path,config.local_eda_flag, profile=config.frontend_plot_profile)
 
 def plot_with_shortage_markers_combined(df):
     df['Date'] = pd.to_datetime(df['Date'])
-    lines = df['Production Line'].unique()
-    num_lines = len(lines)
+    line_parts = partitions.by_line(df)
+    num_lines = len(line_parts)
 
     fig, axes = plt.subplots(num_lines, 1, figsize=(12, 6*num_lines), constrained_layout=True)
 
     if num_lines == 1:
         axes = [axes]
 
-    for ax, line in zip(axes, lines):
-        line_df = df[df['Production Line'] == line].sort_values('Date')
+    for ax, (line, line_df) in zip(axes, line_parts.items()):
+        line_df = line_df.sort_values('Date')
         ax.plot(line_df['Date'], line_df['Raw Material Inventory'], color='blue', label='Inventory')
         ax.plot(line_df['Date'], line_df['Downtime - Raw Material (hrs)']*1000, '--', color='red', label='Downtime (hrs, scaled)')
         ax2 = ax.twinx()
         ax2.plot(line_df['Date'], line_df['Actual Production (units)'], color='green', label='Actual Production')
 
         # Highlight shortages
-        shortage_df = line_df[line_df['Raw Material Availability'].str.contains('Shortage')]
+        shortage_df = line_df[schema.is_shortage(line_df)]
         ax2.scatter(shortage_df['Date'], shortage_df['Actual Production (units)'],
                     color='orange', marker='x', s=100, label='Shortage')
 
@@ -282,6 +322,6 @@ def plot_with_shortage_markers_combined(df):
         ax.set_title(f'{line} - Combined Production & Raw Material Trends (Shortages Highlighted)')
         ax.tick_params(axis='x', rotation=45)
 
-    gcs.smart_savefig(fig, config.combined_production_rm_saved_path,config.local_eda_flag, dpi=85, bbox_inches='tight')
+    gcs.smart_savefig(fig, config.combined_production_rm_saved_path,config.local_eda_flag, profile=config.frontend_plot_profile, bbox_inches='tight')
 
 
@@ -1,10 +1,30 @@
 # modules/data_preprocessing.py
 
+import logging
 import pandas as pd
+import numpy as np
 import os
+import json
 import config
 from io import BytesIO
-from modules import gcs  # ✅ added
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from modules import gcs, schema, parallel  # ✅ added
+
+logger = logging.getLogger("manufacturing_logger")
+
+KEY_COLS = ['Date', 'Production Line', 'Shift']
+
+# Columns whose per-line running aggregates back the metrics matrix
+METRIC_COLUMNS = [
+    'Actual Production (units)',
+    'Total Downtime (hrs)',
+    'Downtime - Raw Material (hrs)',
+    'Downtime - Issues (hrs)',
+    'Raw Material Inventory',
+    'Utilization (%)',
+    'Fulfillment Rate (%)',
+]
 
 # Financial assumptions
 FINANCIAL_PARAMS = {
@@ -15,26 +35,139 @@ FINANCIAL_PARAMS = {
     'holding_cost_rate': 0.2
 }
 
-def load_data():
+# dtype hints for the known source columns – skips per-cell type inference
+SOURCE_DTYPES = {
+    'Production Line': str,
+    'Shift': str,
+    'Raw Material Availability': str,
+    'Issue Severity': str,
+    'Issue Type': str,
+    'Raw Material Inventory': 'float64',
+    'Downtime - Issues (hrs)': 'float64',
+    'Downtime - Raw Material (hrs)': 'float64',
+    'Total Downtime (hrs)': 'float64',
+    'Machine Operation Time (hrs)': 'float64',
+}
+
+def _excel_engine():
+    """calamine (Rust, read-only) when installed, else openpyxl."""
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+def _fetch_source(path):
+    """Download one source (I/O bound); local files are handed over by path."""
+    start = time.perf_counter()
     if config.local_data_flag:
-        issues = pd.read_excel(config.issues_filepath)
-        production = pd.read_excel(config.production_filepath)
-        demand = pd.read_excel(config.demand_filepath)
+        source = path
     else:
-        issues = pd.read_excel(BytesIO(gcs.read_bytes(config.issues_filepath, is_local=False)))
-        production = pd.read_excel(BytesIO(gcs.read_bytes(config.production_filepath, is_local=False)))
-        demand = pd.read_excel(BytesIO(gcs.read_bytes(config.demand_filepath, is_local=False)))
-    
+        source = gcs.read_bytes(path, is_local=False)
+    return source, time.perf_counter() - start
+
+def _parse_source(source, engine):
+    """Parse one workbook (CPU bound). Top-level so it can run in a worker process."""
+    start = time.perf_counter()
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    df = pd.read_excel(source, engine=engine, dtype=SOURCE_DTYPES)
+    return df, time.perf_counter() - start
+
+def load_data(parse_in_processes=None):
+    """Fetch and parse the Issues / Production / Demand sources concurrently.
+
+    Downloads run on a thread pool; each file is parsed as soon as its bytes
+    arrive, on the same threads or – with ``parse_in_processes`` – on the
+    shared worker-process pool (modules.parallel), so wall time tracks the
+    slowest file rather than the sum.
+    """
+    if parse_in_processes is None:
+        parse_in_processes = config.parse_sources_in_processes
+    paths = [config.issues_filepath, config.production_filepath, config.demand_filepath]
+    engine = _excel_engine()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(paths)) as io_pool:
+        # the shared pool uses config.render_start_method, so the threaded
+        # Streamlit server is never forked
+        parse_pool = parallel.process_pool() if parse_in_processes else io_pool
+        fetches = {io_pool.submit(_fetch_source, p): p for p in paths}
+        parses, fetch_secs = {}, {}
+        for fut in as_completed(fetches):
+            path = fetches[fut]
+            source, fetch_secs[path] = fut.result()
+            parses[path] = parse_pool.submit(_parse_source, source, engine)
+
+        frames = []
+        for path in paths:
+            df, parse_secs = parses[path].result()
+            logger.info("Loaded %s: fetch %.2fs, parse %.2fs (%s), %d rows.",
+                        path, fetch_secs[path], parse_secs, engine, len(df))
+            frames.append(df)
+    logger.info("Loaded all sources in %.2fs.", time.perf_counter() - start)
+
+    issues, production, demand = frames
     return issues, production, demand
 
+def source_headers(issues, production, demand):
+    return {
+        'issues': issues.columns.tolist(),
+        'production': production.columns.tolist(),
+        'demand': demand.columns.tolist(),
+    }
+
+def save_source_headers(issues, production, demand):
+    """Store the raw column lists so the preview does not re-open the workbooks."""
+    payload = json.dumps(source_headers(issues, production, demand)).encode('utf-8')
+    gcs.write_bytes(payload, config.source_headers_filepath, config.local_data_flag,
+                    content_type='application/json')
+
+def load_source_headers():
+    return json.loads(gcs.read_bytes(config.source_headers_filepath, config.local_data_flag))
+
+def _keyed(df, name, categories):
+    """Normalise the join keys once and index the frame by a sorted unique MultiIndex."""
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    for col in ('Production Line', 'Shift'):
+        df[col] = pd.Categorical(df[col], categories=categories[col])
+    keyed = df.set_index(KEY_COLS)
+
+    dup = keyed.index.duplicated(keep='last')
+    if dup.any():
+        logger.warning("merge_data: %s has %d duplicated (Date, Production Line, Shift) rows; "
+                       "keeping the last occurrence.", name, int(dup.sum()))
+        keyed = keyed[~dup]
+    return keyed.sort_index()
+
 def merge_data(issues, production, demand):
-    merged = pd.merge(issues, production, on=['Date', 'Production Line', 'Shift'], how='inner')
-    merged = pd.merge(merged, demand, on=['Date', 'Production Line', 'Shift'], how='inner')
-    return merged
+    """Inner-join the three sources on (Date, Production Line, Shift) in one pass.
+
+    Duplicated keys within a source and keys missing from the other sources
+    are logged instead of silently fanning out / disappearing.
+    """
+    sources = {'issues': issues, 'production': production, 'demand': demand}
+    categories = {
+        col: pd.Index(pd.concat([df[col] for df in sources.values()]).dropna().unique())
+        for col in ('Production Line', 'Shift')
+    }
+    keyed = {name: _keyed(df, name, categories) for name, df in sources.items()}
 
-def load_and_preprocess(filepath):
-    df = gcs.load_dataframe(filepath, config.local_data_flag)  # ✅ uses GCS if needed
+    merged = keyed['issues'].join([keyed['production'], keyed['demand']], how='inner')
 
+    for name, df in keyed.items():
+        dropped = len(df) - len(merged)
+        if dropped:
+            logger.warning("merge_data: %d %s keys have no match in the other sources and were dropped.",
+                           dropped, name)
+
+    merged = merged.reset_index()
+    for col in ('Production Line', 'Shift'):
+        merged[col] = merged[col].astype(object)
+    return merged
+
+def add_derived_columns(df):
     # Actual Production
     if 'Production Rate (units/hr)' in df.columns:
         df['Actual Production (units)'] = df['Production Rate (units/hr)'] * (
@@ -57,6 +190,14 @@ def load_and_preprocess(filepath):
 
     return df
 
+def load_and_preprocess(source):
+    """Derive columns from a merged frame, or from a stored one given its path."""
+    if isinstance(source, pd.DataFrame):
+        df = source.copy()   # the caller may still be persisting the merged frame
+    else:
+        df = gcs.load_dataframe(source, config.local_data_flag)  # ✅ uses GCS if needed
+    return add_derived_columns(df)
+
 def generate_unit_metrics(cleaned_df):
     units = cleaned_df['Production Line'].unique()
     metrics = {}
@@ -128,17 +269,326 @@ def metrics_to_matrix(metrics):
     df_matrix.index.name = 'Production Line'
     return df_matrix.reset_index()
 
-def preprocess_and_save():
+def _add_financials(m):
+    """Append the financials_* columns to a flat metrics frame indexed by line."""
+    total = m['production_total']
+    m['financials_total_revenue'] = total * FINANCIAL_PARAMS['unit_price']
+    m['financials_total_cost'] = total * FINANCIAL_PARAMS['unit_cost']
+    m['financials_gross_profit'] = total * FINANCIAL_PARAMS['gross_profit_per_unit']
+    m['financials_downtime_cost'] = m['downtime_total_hrs'] * FINANCIAL_PARAMS['downtime_cost_per_hr']
+    m['financials_net_profit'] = m['financials_gross_profit'] - m['financials_downtime_cost']
+    revenue = m['financials_total_revenue']
+    m['financials_profit_margin'] = (m['financials_net_profit'] / revenue * 100).where(revenue > 0, 0)
+
+    m.index.name = 'Production Line'
+    return m.reset_index()
+
+def unit_metrics_matrix(cleaned_df):
+    """Single-pass groupby equivalent of metrics_to_matrix(generate_unit_metrics(df))."""
+    df = cleaned_df.assign(_shortage=schema.is_shortage(cleaned_df))
+    m = df.groupby('Production Line', sort=False, observed=True).agg(
+        production_total=('Actual Production (units)', 'sum'),
+        production_avg_daily=('Actual Production (units)', 'mean'),
+        production_max_daily=('Actual Production (units)', 'max'),
+        production_min_daily=('Actual Production (units)', 'min'),
+        production_std_daily=('Actual Production (units)', 'std'),
+        downtime_total_hrs=('Total Downtime (hrs)', 'sum'),
+        downtime_avg_daily=('Total Downtime (hrs)', 'mean'),
+        downtime_breakdown_raw_material=('Downtime - Raw Material (hrs)', 'mean'),
+        downtime_breakdown_issues=('Downtime - Issues (hrs)', 'mean'),
+        inventory_avg_daily=('Raw Material Inventory', 'mean'),
+        inventory_min_daily=('Raw Material Inventory', 'min'),
+        inventory_shortage_days=('_shortage', 'sum'),
+        efficiency_avg_utilization=('Utilization (%)', 'mean'),
+        efficiency_avg_fulfillment=('Fulfillment Rate (%)', 'mean'),
+    )
+    return _add_financials(m)
+
+# =============== BACKGROUND WRITES ===============
+# Intermediate artifacts (the merged frame) are not needed to finish the
+# pipeline, so they are written off the critical path.
+
+_write_executor = None
+_pending_writes = []
+
+def _persist_in_background(df, path):
+    global _write_executor
+    if _write_executor is None:
+        _write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist")
+
+    def _save():
+        try:
+            gcs.save_dataframe(df, path, config.local_data_flag)
+            logger.info("Persisted %s in background.", path)
+        except Exception as e:
+            logger.error("Background write of %s failed: %s", path, e)
+            raise
+
+    future = _write_executor.submit(_save)
+    _pending_writes.append(future)
+    future.add_done_callback(_forget_write)
+    return future
+
+def _forget_write(future):
+    try:
+        _pending_writes.remove(future)
+    except ValueError:      # already dropped by flush_pending_writes
+        pass
+
+def flush_pending_writes(timeout=None):
+    """Block until queued background writes are done; returns the unfinished ones."""
+    done, not_done = wait(list(_pending_writes), timeout=timeout)
+    _pending_writes[:] = list(not_done)
+    return not_done
+
+# =============== RUNNING AGGREGATES ===============
+
+def line_aggregates(cleaned_df):
+    """Per-line sum / count / sum of squares / min / max of METRIC_COLUMNS.
+
+    These combine associatively, so aggregates of new rows can be folded into
+    the stored ones without touching the rest of the history.
+    """
+    df = cleaned_df[['Production Line'] + METRIC_COLUMNS].copy()
+    for col in METRIC_COLUMNS:
+        df[f'{col}|sumsq'] = df[col] ** 2
+    df['shortage_count'] = schema.is_shortage(cleaned_df).astype(int)
+
+    spec = {}
+    for col in METRIC_COLUMNS:
+        spec[f'{col}|sum'] = (col, 'sum')
+        spec[f'{col}|count'] = (col, 'count')
+        spec[f'{col}|min'] = (col, 'min')
+        spec[f'{col}|max'] = (col, 'max')
+        spec[f'{col}|sumsq'] = (f'{col}|sumsq', 'sum')
+    spec['shortage_count'] = ('shortage_count', 'sum')
+    return df.groupby('Production Line', sort=False, observed=True).agg(**spec)
+
+def combine_aggregates(*aggs):
+    """Fold several line_aggregates() frames into one."""
+    stacked = pd.concat([a for a in aggs if a is not None and not a.empty])
+    how = {
+        c: ('min' if c.endswith('|min') else 'max' if c.endswith('|max') else 'sum')
+        for c in stacked.columns
+    }
+    return stacked.groupby(level='Production Line', sort=False).agg(how)
+
+def metrics_from_aggregates(aggs):
+    """Build the flat per-line metrics matrix from line_aggregates() output."""
+    def mean(col):
+        return aggs[f'{col}|sum'] / aggs[f'{col}|count']
+
+    prod = 'Actual Production (units)'
+    n = aggs[f'{prod}|count']
+    var = (aggs[f'{prod}|sumsq'] - aggs[f'{prod}|sum'] ** 2 / n) / (n - 1)
+    std = np.sqrt(var.clip(lower=0)).where(n > 1)
+
+    m = pd.DataFrame(index=aggs.index)
+    m['production_total'] = aggs[f'{prod}|sum']
+    m['production_avg_daily'] = mean(prod)
+    m['production_max_daily'] = aggs[f'{prod}|max']
+    m['production_min_daily'] = aggs[f'{prod}|min']
+    m['production_std_daily'] = std
+    m['downtime_total_hrs'] = aggs['Total Downtime (hrs)|sum']
+    m['downtime_avg_daily'] = mean('Total Downtime (hrs)')
+    m['downtime_breakdown_raw_material'] = mean('Downtime - Raw Material (hrs)')
+    m['downtime_breakdown_issues'] = mean('Downtime - Issues (hrs)')
+    m['inventory_avg_daily'] = mean('Raw Material Inventory')
+    m['inventory_min_daily'] = aggs['Raw Material Inventory|min']
+    m['inventory_shortage_days'] = aggs['shortage_count'].astype(int)
+    m['efficiency_avg_utilization'] = mean('Utilization (%)')
+    m['efficiency_avg_fulfillment'] = mean('Fulfillment Rate (%)')
+    return _add_financials(m)
+
+# =============== DASHBOARD AGGREGATES ===============
+# Small tables the Plotly dashboard builds its aggregate charts from, so it
+# never has to group the full cleaned dataset itself.
+
+DOWNTIME_KEYS = ['Production Line', 'Shift', 'Issue Type']
+
+def downtime_by_shift_issue(cleaned_df):
+    """Total downtime per (Production Line, Shift, Issue Type)."""
+    return (cleaned_df.groupby(DOWNTIME_KEYS, as_index=False, observed=True)
+            ['Total Downtime (hrs)'].sum())
+
+def production_vs_downtime(cleaned_df):
+    """Operation time and downtime per (Date, Production Line, Shift)."""
+    df = cleaned_df.assign(Date=pd.to_datetime(cleaned_df['Date']))
+    return (df.groupby(['Date', 'Production Line', 'Shift'], as_index=False, observed=True)
+              .agg(Prod_time=('Machine Operation Time (hrs)', 'sum'),
+                   Downtime=('Total Downtime (hrs)', 'sum')))
+
+def save_dashboard_aggregates(cleaned_df=None, tables=None):
+    """Store the dashboard tables, computed from ``cleaned_df`` unless ``tables`` are given."""
+    downtime, production = tables or (downtime_by_shift_issue(cleaned_df), production_vs_downtime(cleaned_df))
+    gcs.save_dataframe(downtime, config.dashboard_downtime_filepath, config.local_data_flag)
+    gcs.save_dataframe(production, config.dashboard_production_filepath, config.local_data_flag)
+
+def fold_dashboard_aggregates(previous, keys, new_rows, cleaned_df, touched=None):
+    """Update the stored dashboard tables for an incremental ingest.
+
+    ``previous`` is the stored (downtime, production) pair, ``keys`` the
+    changed (Date, Production Line, Shift) keys and ``new_rows`` their cleaned
+    rows. Production rows are per key, so only the changed keys are replaced.
+    Downtime sums fold in the new rows, except for the ``touched`` lines whose
+    stored rows were edited: those are recomputed from ``cleaned_df``.
+    """
+    downtime, production = previous
+    production = pd.concat(
+        [production[~_key_index(production).isin(keys)], production_vs_downtime(new_rows)],
+        ignore_index=True,
+    ).sort_values(KEY_COLS, ignore_index=True)
+
+    if touched:
+        edited = downtime['Production Line'].isin(touched)
+        fresh = downtime_by_shift_issue(cleaned_df[cleaned_df['Production Line'].isin(touched)])
+        downtime = pd.concat([downtime[~edited], fresh], ignore_index=True)
+    else:
+        downtime = (pd.concat([downtime, downtime_by_shift_issue(new_rows)], ignore_index=True)
+                      .groupby(DOWNTIME_KEYS, as_index=False, observed=True)['Total Downtime (hrs)'].sum())
+    return downtime.sort_values(DOWNTIME_KEYS, ignore_index=True), production
+
+def load_dashboard_aggregates(cleaned_df=None):
+    """Return (downtime_by_shift_issue, production_vs_downtime) tables.
+
+    Reads the stored tables; when they are missing (data preprocessed before
+    they existed) and ``cleaned_df`` is given, computes them from it instead.
+    """
+    try:
+        return (gcs.load_dataframe(config.dashboard_downtime_filepath, config.local_data_flag),
+                gcs.load_dataframe(config.dashboard_production_filepath, config.local_data_flag))
+    except (FileNotFoundError, OSError) as e:
+        if cleaned_df is None:
+            raise
+        logger.info("No stored dashboard aggregates (%s); computing them.", e)
+        return downtime_by_shift_issue(cleaned_df), production_vs_downtime(cleaned_df)
+
+# =============== INCREMENTAL INGEST ===============
+
+def _key_index(df):
+    keys = df[KEY_COLS].copy()
+    keys['Date'] = pd.to_datetime(keys['Date'])
+    return pd.MultiIndex.from_frame(keys)
+
+def _key_hashes(df, name):
+    """One content hash per (Date, Production Line, Shift) key of a source frame."""
+    hashes = pd.Series(pd.util.hash_pandas_object(df, index=False).values, index=_key_index(df))
+    return hashes.groupby(level=KEY_COLS).sum().astype('UInt64').rename(f'{name}_hash')
+
+def ingest_state(issues, production, demand):
+    """Key → content-hash table for the three sources, used to spot changed keys."""
+    return pd.concat(
+        [_key_hashes(issues, 'issues'), _key_hashes(production, 'production'), _key_hashes(demand, 'demand')],
+        axis=1,
+    )
+
+def changed_keys(state, previous):
+    """Keys that are new in ``state`` or whose content differs from ``previous``."""
+    joined = state.join(previous, rsuffix='_prev', how='left')
+    changed = pd.Series(False, index=joined.index)
+    for col in state.columns:
+        changed |= joined[col].fillna(0) != joined[f'{col}_prev'].fillna(0)
+    return joined.index[changed.to_numpy()]
+
+def _rows_for_keys(df, keys):
+    return df[_key_index(df).isin(keys)]
+
+def _save_ingest_state(state, aggregates):
+    gcs.save_dataframe(state.reset_index(), config.ingest_state_filepath, config.local_data_flag)
+    gcs.save_dataframe(aggregates.reset_index(), config.line_aggregates_filepath, config.local_data_flag)
+
+def _load_ingest_state():
+    """Return (state, aggregates, cleaned_df) from the previous run, or None."""
+    try:
+        state = gcs.load_dataframe(config.ingest_state_filepath, config.local_data_flag)
+        aggregates = gcs.load_dataframe(config.line_aggregates_filepath, config.local_data_flag)
+        cleaned_df = gcs.load_dataframe(config.cleaned_path, config.local_data_flag)
+    except (FileNotFoundError, OSError) as e:
+        logger.info("No previous ingest state (%s); running full preprocessing.", e)
+        return None
+    state['Date'] = pd.to_datetime(state['Date'])
+    return (
+        state.set_index(KEY_COLS),
+        aggregates.set_index('Production Line'),
+        cleaned_df,
+    )
+
+def _preprocess_incremental(issues, production, demand, state, previous):
+    prev_state, prev_aggs, cleaned_df = previous
+    keys = changed_keys(state, prev_state)
+    if len(keys) == 0:
+        logger.info("Incremental preprocessing: no new or changed shifts.")
+        _save_ingest_state(state, prev_aggs)
+        return
+
+    merged = merge_data(
+        _rows_for_keys(issues, keys), _rows_for_keys(production, keys), _rows_for_keys(demand, keys))
+    new_rows = add_derived_columns(merged)
+    prev_dashboard = load_dashboard_aggregates(cleaned_df)
+
+    replaced = _key_index(cleaned_df).isin(keys)
+    touched = None
+    if replaced.any():
+        # Rows were edited in place – min/max cannot be "un-folded", so
+        # rebuild the aggregates of the affected lines only.
+        touched = set(cleaned_df.loc[replaced, 'Production Line']) | set(new_rows['Production Line'])
+        cleaned_df = pd.concat([cleaned_df[~replaced], new_rows], ignore_index=True)
+        fresh = line_aggregates(cleaned_df[cleaned_df['Production Line'].isin(touched)])
+        aggregates = combine_aggregates(prev_aggs.drop(index=list(touched), errors='ignore'), fresh)
+    else:
+        cleaned_df = pd.concat([cleaned_df, new_rows], ignore_index=True)
+        aggregates = combine_aggregates(prev_aggs, line_aggregates(new_rows))
+    dashboard = fold_dashboard_aggregates(prev_dashboard, keys, new_rows, cleaned_df, touched)
+
+    cleaned_df = cleaned_df.sort_values(KEY_COLS, kind='stable', ignore_index=True)
+    aggregates = aggregates.reindex(cleaned_df['Production Line'].unique())
+
+    logger.info("Incremental preprocessing: %d changed keys, %d rows replaced, %d rows merged.",
+                len(keys), int(replaced.sum()), len(new_rows))
+    # derived tables first: a reader that sees the new cleaned version must
+    # not find the previous tables next to it
+    gcs.save_dataframe(metrics_from_aggregates(aggregates), config.linewise_pivot_data_filepath, config.local_data_flag)
+    save_dashboard_aggregates(tables=dashboard)
+    gcs.save_dataframe(cleaned_df, config.cleaned_path, config.local_data_flag)
+    _save_ingest_state(state, aggregates)
+
+def preprocess_and_save(incremental=False):
+    """Run the ingest pipeline.
+
+    With ``incremental=True`` only (Date, Production Line, Shift) keys that are
+    new or changed since the last run are merged and derived; they are upserted
+    into the stored cleaned dataset and folded into the stored per-line
+    aggregates.  Keys missing from the new upload are kept (uploads may only
+    carry the latest shifts) – run a full preprocess to drop them.
+    """
     issues, production, demand = load_data()
+    save_source_headers(issues, production, demand)
+    state = ingest_state(issues, production, demand)
+
+    if incremental:
+        previous = _load_ingest_state()
+        if previous is not None:
+            _preprocess_incremental(issues, production, demand, state, previous)
+            return
+
     merged = merge_data(issues, production, demand)
-    gcs.save_dataframe(merged, config.merged_data_filepath, config.local_data_flag) 
+    if config.persist_merged_data:
+        if config.persist_merged_async:
+            _persist_in_background(merged, config.merged_data_filepath)
+        else:
+            gcs.save_dataframe(merged, config.merged_data_filepath, config.local_data_flag)
 
-    cleaned_df = load_and_preprocess(config.merged_data_filepath)
-    gcs.save_dataframe(cleaned_df, config.cleaned_path, config.local_data_flag)  
-    metrics = generate_unit_metrics(cleaned_df)
-    df_matrix = metrics_to_matrix(metrics)
+    cleaned_df = load_and_preprocess(merged)
+    df_matrix = unit_metrics_matrix(cleaned_df)
     gcs.save_dataframe(df_matrix, config.linewise_pivot_data_filepath, config.local_data_flag)  
+    save_dashboard_aggregates(cleaned_df)
+    # written last: its version is what readers key the tables above on
+    gcs.save_dataframe(cleaned_df, config.cleaned_path, config.local_data_flag)  
+    _save_ingest_state(state, line_aggregates(cleaned_df))
 
 # ✅ DO NOT CALL ANYTHING HERE OUTSIDE MAIN
 if __name__ == "__main__":
-    preprocess_and_save()
\ No newline at end of file
+    from modules.logger import init_logger
+    init_logger(config.local_log_flag)
+    preprocess_and_save()
+    flush_pending_writes()
@@ -0,0 +1,56 @@
+# modules/downsampling.py
+
+import numpy as np
+import plotly.graph_objects as go
+
+import config
+
+# Helpers that keep Plotly charts responsive on long time series: line traces
+# above config.plot_max_points are reduced to the min and max of evenly sized
+# buckets (peaks and dips survive, unlike plain striding), and traces above
+# config.plot_webgl_threshold points are drawn with WebGL.
+
+def minmax_indices(y, n_out=None):
+    """Sorted positions of the points kept when reducing ``y`` to ~``n_out``.
+
+    The first and last points are always kept; in between, each bucket
+    contributes the position of its minimum and of its maximum. NaNs are
+    ignored when picking the extremes.
+    """
+    n_out = n_out or config.plot_max_points
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+
+    n_buckets = (n_out - 2) // 2
+    edges = np.linspace(1, n - 1, n_buckets + 1).astype(int)
+    lows = np.where(np.isnan(y), np.inf, y)
+    highs = np.where(np.isnan(y), -np.inf, y)
+
+    keep = [0, n - 1]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop > start:
+            keep.append(start + int(np.argmin(lows[start:stop])))
+            keep.append(start + int(np.argmax(highs[start:stop])))
+    return np.unique(keep)
+
+def downsample(df, y, n_out=None):
+    """Rows of ``df`` (already sorted along x) kept by min/max downsampling of column ``y``."""
+    return df.iloc[minmax_indices(df[y].to_numpy(), n_out)]
+
+def scatter(x, y, mode="lines", **kwargs):
+    """A Scatter trace, downsampled for lines and switched to WebGL when large.
+
+    Marker-only traces are never downsampled – every marked event is kept.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if "lines" in mode:
+        keep = minmax_indices(y)
+        x, y = x[keep], y[keep]
+    trace = go.Scattergl if len(x) > config.plot_webgl_threshold else go.Scatter
+    return trace(x=x, y=y, mode=mode, **kwargs)
+
+def box_points(n):
+    """``points=`` for a box plot of ``n`` values: every point only while that stays cheap."""
+    return "all" if n <= config.plot_max_points else "outliers"
@@ -1,7 +1,13 @@
 # modules/gcs.py
 
 import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
 import config
+from contextlib import contextmanager
 from google.cloud import storage
 import streamlit as st
 from dotenv import load_dotenv
@@ -24,6 +30,133 @@ def _get_client():
 def _get_bucket():
     return _get_client().bucket(config.GCS_BUCKET_NAME)
 
+# =============== LOCAL READ CACHE ===============
+# Remote reads go through a small on-disk cache.  Object bodies are stored
+# content-addressed by (bucket, path, generation); a per-path meta file keeps
+# the generation last seen and when it was last checked against GCS.
+
+def _cache_key(remote_path: str, generation=None) -> str:
+    key = f"{config.GCS_BUCKET_NAME}/{remote_path}"
+    if generation is not None:
+        key += f"#{generation}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _cache_paths(remote_path: str, generation=None):
+    base = config.gcs_cache_dir
+    meta = os.path.join(base, "meta", _cache_key(remote_path) + ".json")
+    data = None
+    if generation is not None:
+        data = os.path.join(base, "objects", _cache_key(remote_path, generation))
+    return meta, data
+
+def _atomic_write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # unique per write: threads of one process may write the same path at once
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path),
+                               prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _cache_read_meta(remote_path: str):
+    meta_path, _ = _cache_paths(remote_path)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _cache_get(remote_path: str, generation, revalidated: bool = False):
+    """Return cached bytes for this generation (and mark them recently used)."""
+    _, data_path = _cache_paths(remote_path, generation)
+    try:
+        with open(data_path, "rb") as f:
+            content = f.read()
+    except OSError:
+        return None
+    os.utime(data_path, None)   # LRU order is file mtime
+    if revalidated:
+        try:
+            _cache_write_meta(remote_path, generation)
+        except OSError as e:
+            print(f"⚠️ GCS cache meta update failed for {remote_path}: {e}")
+    return content
+
+def _cache_write_meta(remote_path: str, generation):
+    meta_path, _ = _cache_paths(remote_path)
+    _atomic_write(meta_path, json.dumps(
+        {"path": remote_path, "generation": generation, "checked_at": time.time()}).encode("utf-8"))
+
+def _cache_put(remote_path: str, generation, content: bytes):
+    if not config.gcs_cache_enabled or generation is None:
+        return
+    try:
+        _, data_path = _cache_paths(remote_path, generation)
+        _atomic_write(data_path, content)
+        _cache_write_meta(remote_path, generation)
+        _cache_evict()
+    except OSError as e:
+        print(f"⚠️ GCS cache write failed for {remote_path}: {e}")
+
+def _cache_files(sub):
+    """``(mtime, size, path)`` of the finished files in a cache subdirectory."""
+    folder = os.path.join(config.gcs_cache_dir, sub)
+    entries = []
+    for name in os.listdir(folder) if os.path.isdir(folder) else []:
+        if name.endswith(".tmp"):
+            continue
+        full = os.path.join(folder, name)
+        try:
+            stat = os.stat(full)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, full))
+    return entries
+
+def _cache_evict():
+    """Drop least-recently-used objects until the cache (objects and meta
+    files) fits its size budget, then the meta files of evicted objects."""
+    objects, metas = _cache_files("objects"), _cache_files("meta")
+    total = sum(size for _, size, _ in objects) + sum(size for _, size, _ in metas)
+    evicted = False
+    for _, size, full in sorted(objects):
+        if total <= config.gcs_cache_max_bytes:
+            break
+        try:
+            os.remove(full)
+            total -= size
+            evicted = True
+        except OSError:
+            pass
+    if not evicted:
+        return
+
+    for _, _, meta_path in metas:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            _, data_path = _cache_paths(meta["path"], meta["generation"])
+            if os.path.exists(data_path):
+                continue
+        except (OSError, ValueError, KeyError):
+            pass   # unreadable or written before meta files named their path
+        try:
+            os.remove(meta_path)
+        except OSError:
+            pass
+
+def clear_cache():
+    """Remove every cached object (e.g. after editing the bucket by hand)."""
+    import shutil
+    shutil.rmtree(config.gcs_cache_dir, ignore_errors=True)
+
 # =============== FLAG-CONTROLLED I/O ===============
 
 def write_bytes(content: bytes, remote_path: str, is_local: bool, content_type: str = "application/octet-stream"):
@@ -36,51 +169,185 @@ def write_bytes(content: bytes, remote_path: str, is_local: bool, content_type:
         remote_path = remote_path.replace("\\", "/")
         blob = _get_bucket().blob(remote_path)
         blob.upload_from_string(content, content_type=content_type)
+        _cache_put(remote_path, blob.generation, content)
         print(f"⬆️ Uploaded to GCS: {remote_path} ({content_type})")
 
 
 
 def read_bytes(remote_path: str, is_local: bool) -> bytes:
-    """Read bytes from local or GCS based on flag."""
+    """Read bytes from local or GCS based on flag.
+
+    GCS reads are served from the local cache when the object generation is
+    unchanged: within ``gcs_cache_ttl_seconds`` of the last check no request
+    is made at all, afterwards a single metadata call revalidates the entry.
+    """
     if is_local:
         with open(remote_path, "rb") as f:
             return f.read()
-    else:
-        blob = _get_bucket().blob(remote_path)
-        if not blob.exists():
-            raise FileNotFoundError(f"[GCS] File not found: {remote_path}")
-        return blob.download_as_bytes()
+
+    remote_path = remote_path.replace("\\", "/")
+    if config.gcs_cache_enabled:
+        meta = _cache_read_meta(remote_path)
+        if meta and time.time() - meta["checked_at"] < config.gcs_cache_ttl_seconds:
+            content = _cache_get(remote_path, meta["generation"])
+            if content is not None:
+                return content
+
+    blob = _get_bucket().get_blob(remote_path)   # metadata only
+    if blob is None:
+        raise FileNotFoundError(f"[GCS] File not found: {remote_path}")
+
+    if config.gcs_cache_enabled:
+        content = _cache_get(remote_path, blob.generation, revalidated=True)
+        if content is not None:
+            return content
+
+    content = blob.download_as_bytes(if_generation_match=blob.generation)
+    _cache_put(remote_path, blob.generation, content)
+    return content
+
+def _dataframe_format(path: str) -> str:
+    """Pick the on-disk format from the file extension (defaults to CSV)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".feather", ".arrow"):
+        return "feather"
+    return "csv"
 
 def save_dataframe(df, path: str, is_local: bool):
-    """Save Pandas dataframe as CSV to local or GCS."""
-    if is_local:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        df.to_csv(path, index=False)
+    """Save Pandas dataframe to local or GCS (CSV, Parquet or Feather by extension)."""
+    fmt = _dataframe_format(path)
+    buf = BytesIO()
+    if fmt == "parquet":
+        df.to_parquet(buf, index=False, engine="pyarrow",
+                      compression=config.parquet_compression,
+                      row_group_size=config.parquet_row_group_size)
+        content_type = "application/vnd.apache.parquet"
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(buf, compression=config.feather_compression)
+        content_type = "application/vnd.apache.arrow.file"
     else:
-        buf = BytesIO()
         df.to_csv(buf, index=False)
-        buf.seek(0)
-        write_bytes(buf.read(), path, is_local)
+        content_type = "text/csv"
+    write_bytes(buf.getvalue(), path, is_local, content_type=content_type)
 
 def load_dataframe(path: str, is_local: bool):
-    """Load Pandas dataframe from local or GCS."""
+    """Load Pandas dataframe from local or GCS (CSV, Parquet or Feather by extension)."""
     import pandas as pd
-    if is_local:
-        return pd.read_csv(path)
-    else:
-        content = read_bytes(path, is_local)
-        return pd.read_csv(BytesIO(content))
+    fmt = _dataframe_format(path)
+    source = path if is_local else BytesIO(read_bytes(path, is_local))
+
+    if fmt == "parquet":
+        return pd.read_parquet(source, engine="pyarrow")
+    if fmt == "feather":
+        return pd.read_feather(source)
+    return pd.read_csv(source)
+
+# Figures saved while capture_figures() is active are rendered to bytes and
+# handed back to the caller instead of being written (used by worker processes,
+# which return the images so the parent can upload them).
+_capture = threading.local()
+
+@contextmanager
+def capture_figures():
+    """Collect smart_savefig output as ``[(path, bytes, content_type), ...]``."""
+    _capture.items = []
+    try:
+        yield _capture.items
+    finally:
+        _capture.items = None
+
+_IMAGE_CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+def image_content_type(path: str) -> str:
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    return _IMAGE_CONTENT_TYPES.get(ext, "image/png")
+
+def profile_path(path: str, profile=None) -> str:
+    """Path a figure is stored at under a render profile (extension follows the format)."""
+    if profile is None:
+        return path
+    fmt = config.RENDER_PROFILES[profile]["format"]
+    ext = "jpg" if fmt == "jpeg" else fmt
+    return os.path.splitext(path)[0] + "." + ext
+
+def _profile_savefig_kwargs(fig, profile, kwargs):
+    spec = config.RENDER_PROFILES[profile]
+    dpi = spec["dpi"]
+    if spec.get("max_px"):
+        dpi = min(dpi, spec["max_px"] / max(fig.get_size_inches()))
+    out = dict(kwargs, dpi=dpi, format=spec["format"])
+    if spec.get("quality") and spec["format"] != "png":
+        out["pil_kwargs"] = {"quality": spec["quality"]}
+    return out
+
+def smart_savefig(fig, path: str, is_local: bool, profile=None, **kwargs):
+    """Save matplotlib figure locally or to GCS directly.
+
+    With ``profile`` (a key of ``config.RENDER_PROFILES``) the dpi and format
+    come from the profile and the extension of ``path`` is adjusted to match.
+    """
+    if profile is not None:
+        path = profile_path(path, profile)
+        kwargs = _profile_savefig_kwargs(fig, profile, kwargs)
+    fmt = kwargs.pop("format", None) or os.path.splitext(path)[1].lstrip(".").lower() or "png"
+    content_type = image_content_type("." + fmt)
+
+    captured = getattr(_capture, "items", None)
+    if captured is not None:
+        buf = BytesIO()
+        fig.savefig(buf, format=fmt, **kwargs)
+        captured.append((path, buf.getvalue(), content_type))
+        return
 
-def smart_savefig(fig, path: str, is_local: bool, **kwargs):
-    """Save matplotlib figure locally or to GCS directly."""
     if is_local:
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        fig.savefig(path, **kwargs)
+        fig.savefig(path, format=fmt, **kwargs)
     else:
         buf = BytesIO()
-        fig.savefig(buf, format="png", **kwargs)
+        fig.savefig(buf, format=fmt, **kwargs)
         buf.seek(0)
-        write_bytes(buf.read(), path, is_local, content_type="image/png")
+        write_bytes(buf.read(), path, is_local, content_type=content_type)
+
+def exists(path: str, is_local: bool) -> bool:
+    """True if the object exists (one metadata call on GCS)."""
+    if is_local:
+        return os.path.exists(path)
+    return _get_bucket().blob(path.replace("\\", "/")).exists()
+
+def version(path: str, is_local: bool) -> str:
+    """Token that changes whenever the object is rewritten (mtime+size / GCS generation)."""
+    if is_local:
+        stat = os.stat(path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    blob = _get_bucket().get_blob(path.replace("\\", "/"))   # metadata only
+    if blob is None:
+        raise FileNotFoundError(f"[GCS] File not found: {path}")
+    return str(blob.generation)
+
+def copy(src_path: str, dst_path: str, is_local: bool):
+    """Copy an object (server-side on GCS, so nothing is re-uploaded)."""
+    if is_local:
+        import shutil
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        shutil.copyfile(src_path, dst_path)
+    else:
+        src_path = src_path.replace("\\", "/")
+        dst_path = dst_path.replace("\\", "/")
+        bucket = _get_bucket()
+        bucket.copy_blob(bucket.blob(src_path), bucket, dst_path)
+        # drop the cached generation so the next read revalidates dst
+        meta_path, _ = _cache_paths(dst_path)
+        try:
+            os.remove(meta_path)
+        except OSError:
+            pass
 
 
 def save_pdf(html_content: str, path: str, is_local: bool):
@@ -104,6 +371,7 @@ def upload_blob_from_bytes(content, destination_blob_name, content_type="applica
     bucket = _get_bucket()
     blob = bucket.blob(destination_blob_name)
     blob.upload_from_string(content, content_type=content_type)
+    _cache_put(destination_blob_name, blob.generation, content)
 
 def upload_log_file(log_bytes, remote_path=config.log_file_name):
     if log_bytes:
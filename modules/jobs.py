@@ -0,0 +1,264 @@
+# modules/jobs.py
+
+import logging
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import config
+
+logger = logging.getLogger("manufacturing_logger")
+
+# Background job queue for long-running work (report generation). Jobs live
+# in a SQLite table on disk. Detached worker processes (`python -m
+# modules.jobs`) claim and run them, so a job survives Streamlit reruns and
+# browser disconnects. A job's id is a hash of its kind and parameters, so
+# submitting an identical job while one is queued or running returns the
+# existing one. Workers heartbeat while alive; running jobs whose worker
+# stopped heartbeating are put back in the queue.
+
+ROOT = os.path.dirname(os.path.abspath(config.__file__))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    status      TEXT NOT NULL,          -- queued | running | done | failed
+    progress    REAL NOT NULL DEFAULT 0,
+    message     TEXT,
+    result      TEXT,
+    error       TEXT,
+    worker_pid  INTEGER,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    pid        INTEGER PRIMARY KEY,
+    heartbeat  REAL NOT NULL
+);
+"""
+
+_spawned = []          # Popen handles, kept so finished workers get reaped
+
+def _connect():
+    os.makedirs(os.path.dirname(config.report_jobs_db) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.report_jobs_db, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def job_id(kind, params):
+    payload = json.dumps({"kind": kind, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def _requeue_orphans(conn):
+    """Put running jobs whose worker stopped heartbeating back in the queue."""
+    cutoff = time.time() - config.report_worker_stale_seconds
+    conn.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
+    n = conn.execute(
+        "UPDATE jobs SET status = 'queued', worker_pid = NULL, message = 'Re-queued' "
+        "WHERE status = 'running' AND worker_pid NOT IN (SELECT pid FROM workers)"
+    ).rowcount
+    if n:
+        logger.warning("Re-queued %d job(s) left by stopped workers.", n)
+
+# =============== CLIENT SIDE ===============
+
+def submit(kind, params, force=False):
+    """Queue a job and return its id.
+
+    An identical job that is queued or running is returned instead of queuing
+    a duplicate; so is a finished one unless ``force`` is set. Failed jobs
+    are queued again.
+    """
+    jid = job_id(kind, params)
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (jid,)).fetchone()
+        if row is not None and (row["status"] in ("queued", "running")
+                                or (row["status"] == "done" and not force)):
+            conn.execute("COMMIT")
+            logger.info("Job %s (%s %s) already %s.", jid, kind, params, row["status"])
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, params, status, progress, message, created_at) "
+                "VALUES (?, ?, ?, 'queued', 0, 'Queued', ?)",
+                (jid, kind, json.dumps(params, sort_keys=True), time.time()),
+            )
+            conn.execute("COMMIT")
+            logger.info("Queued job %s (%s %s).", jid, kind, params)
+    finally:
+        conn.close()
+    ensure_workers()
+    return jid
+
+def get(jid):
+    """The job row as a dict (``params`` and ``result`` decoded), or None."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (jid,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+def ensure_workers():
+    """Start worker processes until config.report_workers are heartbeating."""
+    for proc in list(_spawned):
+        if proc.poll() is not None:
+            _spawned.remove(proc)
+
+    conn = _connect()
+    try:
+        _requeue_orphans(conn)
+        registered = {row[0] for row in conn.execute("SELECT pid FROM workers")}
+    finally:
+        conn.close()
+    # workers that were started but have not registered yet count as well
+    starting = [proc for proc in _spawned if proc.pid not in registered]
+    for _ in range(config.report_workers - len(registered) - len(starting)):
+        _spawned.append(subprocess.Popen(
+            [sys.executable, "-m", "modules.jobs"],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        ))
+        logger.info("Started job worker (pid %d).", _spawned[-1].pid)
+
+# =============== WORKER SIDE ===============
+
+def _job_data(params):
+    """Cleaned data of the version the job was queued for.
+
+    The stored version is re-checked first, so a long-lived worker neither
+    rejects a job queued after a re-upload nor renders one against the frame
+    it already holds. Fails when the dataset was replaced since queuing.
+    """
+    from modules import shared_data
+    shared_data.refresh()
+    version, df = shared_data.current()
+    if "data" in params and str(params["data"]) != str(version):
+        raise RuntimeError("The data changed since this job was queued; generate it again.")
+    return df
+
+def _run_report(params, progress):
+    from modules import report
+    df = _job_data(params)
+    return report.generate_report(params["date"], params["shift"], df=df, on_progress=progress)
+
+def _run_report_batch(params, progress):
+    from modules import report
+    df = _job_data(params)
+    cutoffs = report.report_cutoffs(params["start"], params["end"], params["shifts"])
+    return report.generate_reports(cutoffs, skip_existing=not params.get("force"),
+                                   df=df, on_progress=progress)
+
+JOB_KINDS = {
+    "report": _run_report,
+    "report_batch": _run_report_batch,
+}
+
+def _claim(conn, pid):
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute(
+        "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+    if row is not None:
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ?, "
+            "progress = 0, message = 'Started', error = NULL WHERE id = ?",
+            (pid, time.time(), row["id"]),
+        )
+    conn.execute("COMMIT")
+    return row
+
+def _heartbeat(pid, stop):
+    conn = _connect()
+    try:
+        while not stop.wait(config.report_job_poll_seconds):
+            conn.execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (pid, time.time()))
+    finally:
+        conn.close()
+
+def work():
+    """Worker loop: run queued jobs until idle for config.report_worker_idle_seconds."""
+    pid = os.getpid()
+    conn = _connect()
+    conn.execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (pid, time.time()))
+    if conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0] > config.report_workers:
+        conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+        conn.close()
+        return
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(pid, stop), daemon=True).start()
+    logger.info("Job worker %d started.", pid)
+    idle_since = time.time()
+    try:
+        while True:
+            _requeue_orphans(conn)
+            row = _claim(conn, pid)
+            if row is None:
+                if time.time() - idle_since > config.report_worker_idle_seconds:
+                    break
+                time.sleep(config.report_job_poll_seconds)
+                continue
+
+            jid = row["id"]
+            logger.info("Worker %d running job %s (%s).", pid, jid, row["kind"])
+
+            def progress(fraction, message, jid=jid):
+                conn.execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?",
+                             (float(fraction), message, jid))
+
+            try:
+                result = JOB_KINDS[row["kind"]](json.loads(row["params"]), progress)
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', progress = 1, message = 'Done', "
+                    "result = ?, finished_at = ? WHERE id = ?",
+                    (json.dumps(result), time.time(), jid),
+                )
+                logger.info("Job %s done.", jid)
+            except Exception as e:
+                logger.error("Job %s failed: %s", jid, e)
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', message = 'Failed', error = ?, "
+                    "finished_at = ? WHERE id = ?",
+                    (str(e), time.time(), jid),
+                )
+            _upload_logs()
+            idle_since = time.time()
+    finally:
+        stop.set()
+        conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+        conn.close()
+        logger.info("Job worker %d stopped.", pid)
+
+def _upload_logs():
+    if config.local_log_flag:
+        return
+    from modules import gcs
+    from modules.logger import get_log_stream, upload_log_to_gcs
+    log_stream = get_log_stream()
+    if log_stream is not None:
+        upload_log_to_gcs(log_stream.getvalue(), gcs)
+        log_stream.truncate(0)
+        log_stream.seek(0)
+
+if __name__ == "__main__":
+    from modules.logger import init_logger
+    init_logger(config.local_log_flag)
+    work()
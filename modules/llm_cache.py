@@ -0,0 +1,157 @@
+# modules/llm_cache.py
+
+import logging
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import config
+
+logger = logging.getLogger("manufacturing_logger")
+
+# Persistent cache of chat-completion responses in a local SQLite file, so
+# re-rendering a report for unchanged data (and Streamlit reruns) does not
+# call the model again. Entries expire after llm_cache_ttl_seconds; above
+# llm_cache_max_bytes the least recently used ones are dropped.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key        TEXT PRIMARY KEY,
+    model      TEXT NOT NULL,
+    response   TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used  REAL NOT NULL
+)
+"""
+
+def _connect():
+    os.makedirs(os.path.dirname(config.llm_cache_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.llm_cache_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    return conn
+
+def _digest_images(content):
+    """Message content with inline (data-URL) images replaced by their sha256."""
+    if not isinstance(content, list):
+        return content
+    parts = []
+    for part in content:
+        url = part.get("image_url", {}).get("url", "") if isinstance(part, dict) else ""
+        if url.startswith("data:"):
+            digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+            part = dict(part, image_url={"url": f"sha256:{digest}"})
+        parts.append(part)
+    return parts
+
+def request_key(model, messages, temperature=None):
+    """Cache key: model, temperature, prompt text and image digests."""
+    canonical = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [dict(m, content=_digest_images(m.get("content"))) for m in messages],
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+def get(key):
+    with closing(_connect()) as conn, conn:
+        row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > config.llm_cache_ttl_seconds:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+def put(key, model, response):
+    size = len(response.encode("utf-8"))
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, response, size, now, now),
+        )
+        _evict(conn)
+
+def _evict(conn):
+    conn.execute("DELETE FROM responses WHERE created_at < ?",
+                 (time.time() - config.llm_cache_ttl_seconds,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= config.llm_cache_max_bytes:
+        return
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+        if total <= config.llm_cache_max_bytes:
+            break
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+
+def clear():
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM responses")
+
+def _lookup(key, model):
+    try:
+        cached = get(key)
+    except sqlite3.Error as e:
+        logger.warning("LLM cache read failed: %s", e)
+        return None
+    if cached is not None:
+        logger.info("LLM cache hit (%s, %s…)", model, key[:12])
+    return cached
+
+def _store(key, model, content):
+    try:
+        put(key, model, content)
+    except sqlite3.Error as e:
+        logger.warning("LLM cache write failed: %s", e)
+
+def chat_completion(client, model, messages, temperature=None, **kwargs):
+    """``client.chat.completions.create(...)`` content, served from the cache when possible."""
+    key = request_key(model, messages, temperature) if config.llm_cache_enabled else None
+    if key is not None:
+        cached = _lookup(key, model)
+        if cached is not None:
+            return cached
+
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    resp = client.chat.completions.create(model=model, messages=messages, **kwargs)
+    content = resp.choices[0].message.content
+
+    if key is not None and content:
+        _store(key, model, content)
+    return content
+
+def chat_completion_stream(client, model, messages, temperature=None, **kwargs):
+    """Streaming ``chat_completion``: yields the response text as it arrives.
+
+    A cached response is yielded in one piece; a fresh one is cached once the
+    stream has finished.
+    """
+    key = request_key(model, messages, temperature) if config.llm_cache_enabled else None
+    if key is not None:
+        cached = _lookup(key, model)
+        if cached is not None:
+            yield cached
+            return
+
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    content = "".join(parts)
+    if key is not None and content:
+        _store(key, model, content)
@@ -0,0 +1,89 @@
+# modules/parallel.py
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from modules import gcs
+
+logger = logging.getLogger("manufacturing_logger")
+_pool = None
+_pool_lock = threading.Lock()
+
+def process_pool():
+    """Shared worker-process pool for figure rendering (created on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            ctx = multiprocessing.get_context(config.render_start_method)
+            _pool = ProcessPoolExecutor(max_workers=config.render_workers, mp_context=ctx)
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def render_figures(fn, *args, **kwargs):
+    """Worker entry point: run a plotting function and return what it saved.
+
+    Returns ``[(path, image_bytes, content_type), ...]`` – one entry per
+    ``gcs.smart_savefig`` call made by ``fn``.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    with gcs.capture_figures() as saved:
+        fn(*args, **kwargs)
+    plt.close("all")
+    return saved
+
+def render_and_store(jobs, is_local):
+    """Render plotting jobs in worker processes and store their figures.
+
+    ``jobs`` is a list of ``(fn, args, kwargs)``. Each finished figure is
+    written/uploaded on a thread pool while the remaining ones still render.
+    Returns one entry per job: a list of ``(path, image_bytes)`` for the
+    figures it stored, or the exception that job raised.
+    """
+    results = [None] * len(jobs)
+    try:
+        pool = process_pool()
+        futures = {pool.submit(render_figures, fn, *args, **kwargs): i
+                   for i, (fn, args, kwargs) in enumerate(jobs)}
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as io_pool:
+        uploads = {}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                saved = fut.result()
+            except BrokenProcessPool as e:
+                _reset_pool()
+                results[i] = e
+                continue
+            except Exception as e:
+                results[i] = e
+                continue
+            uploads[i] = [
+                (path, content, io_pool.submit(gcs.write_bytes, content, path, is_local, content_type))
+                for path, content, content_type in saved
+            ]
+
+        for i, pending in uploads.items():
+            try:
+                for _, _, f in pending:
+                    f.result()
+                results[i] = [(path, content) for path, content, _ in pending]
+            except Exception as e:
+                results[i] = e
+    return results
@@ -0,0 +1,53 @@
+# modules/partitions.py
+
+import weakref
+
+# Row positions per group, cached per dataframe object. Slices are taken
+# from the positions on demand, so the cache costs one int array per frame
+# and building every per-line / per-shift view is a single O(n) pass.
+_index_cache = {}
+
+def _group_positions(df, columns):
+    key = tuple(columns)
+    entry = _index_cache.get(id(df))
+    if entry is None or entry[0]() is not df:
+        ref = weakref.ref(df, lambda _, k=id(df): _index_cache.pop(k, None))
+        entry = (ref, {})
+        _index_cache[id(df)] = entry
+
+    positions = entry[1]
+    if key not in positions:
+        grouped = df.groupby(list(columns), sort=False, observed=True, dropna=True)
+        idx = grouped.indices
+        # keep first-appearance order (what df[col].unique() gives)
+        first = sorted(idx, key=lambda k: idx[k][0])
+        positions[key] = {k: idx[k] for k in first}
+    return positions[key]
+
+def split(df, columns):
+    """Map each group value (or tuple of values) to its slice of ``df``.
+
+    Slices are ordered by first appearance. Treat ``df`` as read-only while
+    reusing it: the positions are cached against the object, not its contents.
+    """
+    if isinstance(columns, str):
+        columns = [columns]
+    return {k: df.take(pos) for k, pos in _group_positions(df, columns).items()}
+
+def rows(df, columns, key):
+    """Slice of ``df`` for a single group key (empty frame when absent)."""
+    if isinstance(columns, str):
+        columns = [columns]
+    pos = _group_positions(df, columns).get(key)
+    return empty_like(df) if pos is None else df.take(pos)
+
+def by_line(df):
+    """``{line: rows}`` for every production line in ``df``."""
+    return split(df, 'Production Line')
+
+def by_line_shift(df):
+    """``{(line, shift): rows}`` for every line/shift combination in ``df``."""
+    return split(df, ['Production Line', 'Shift'])
+
+def empty_like(df):
+    return df.iloc[0:0].copy()
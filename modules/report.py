@@ -0,0 +1,241 @@
+# modules/report.py
+
+import logging
+import os
+import time
+import pandas as pd
+
+import config
+from modules import utils, EDA_backend, prompts, gcs, shared_data, task_graph
+
+logger = logging.getLogger("manufacturing_logger")
+
+BACKEND_PLOT_PATHS = {
+    "Line1": config.line1_combined_analysis_path,
+    "Line2": config.line2_combined_analysis_path,
+    "Line3": config.line3_combined_analysis_path,
+}
+
+def report_path(report_date, shift):
+    return f"Reports_Created/Report_{pd.to_datetime(report_date):%Y-%m-%d}_{shift}.pdf"
+
+def existing_report(out_path):
+    """True when a stored report can be re-used instead of regenerated."""
+    return config.local_report_flag and os.path.exists(out_path)
+
+# =============== REPORT INPUTS (TASK GRAPH) ===============
+
+def report_tasks(df, report_date, shift, plot_paths=None, prefix=""):
+    """Task graph for everything the report prompt needs.
+
+    One figure per line. Each line's LLM analysis waits only for that line's
+    figure. The LP deficit plan and the metrics load depend on nothing.
+    Task names are prefixed with ``prefix`` so several reports can share one
+    graph; ``plot_paths`` overrides where the figures are stored (see
+    EDA_backend.create_combined_linewise_figures).
+    """
+    safe_date = pd.to_datetime(report_date).strftime("%Y-%m-%d")
+    plot_paths = plot_paths or BACKEND_PLOT_PATHS
+    p = prefix
+
+    def make_figure(line):
+        def task(_):
+            res = EDA_backend.create_combined_linewise_figures(
+                df=df, save_paths={line: plot_paths[line]},
+                date=safe_date, shift=shift)[line]
+            if isinstance(res, Exception):
+                raise res
+            return res
+        return task
+
+    def make_analysis(line):
+        # runs even if the figure failed: the last stored figure is analysed
+        # (batch reports have no stored figure to fall back on)
+        def task(r):
+            figure = r.get(f"{p}figure:{line}")
+            path = figure[0] if isinstance(figure, tuple) else plot_paths.get(line)
+            if path is None:
+                raise RuntimeError(f"No figure for {line}") from (
+                    figure if isinstance(figure, Exception) else None)
+            return utils.analyse_line_plot(line, path)
+        return task
+
+    def deficit_task(_):
+        try:
+            return utils.run_recovery_text_output(report_date, shift, df=df)
+        except Exception as e:
+            logger.error("Deficit plan gen failed: %s", e)
+            return "Deficit plan generation failed."
+
+    def metrics_task(_):
+        try:
+            metrics_df = gcs.load_dataframe(
+                config.linewise_pivot_data_filepath,
+                config.local_data_flag,
+            )
+            return metrics_df.to_string()
+        except Exception as e:
+            logger.error("Failed to load metrics: %s", e)
+            return "Failed to load metrics."
+
+    lines = df["Production Line"].dropna().unique()
+    figure_lines = [l for l in lines if l in plot_paths]
+    tasks = {f"{p}figure:{l}": (make_figure(l), []) for l in figure_lines}
+    for l in utils.ANALYSIS_PLOTS:
+        deps = [f"{p}figure:{l}"] if l in figure_lines else []
+        tasks[f"{p}analysis:{l}"] = (make_analysis(l), deps)
+    tasks[f"{p}prod_issue"] = (
+        lambda r: utils.format_manufacturing_analysis(
+            {k.rsplit(":", 1)[1]: v for k, v in r.items()}),
+        [f"{p}analysis:{l}" for l in utils.ANALYSIS_PLOTS],
+    )
+    tasks[f"{p}deficit"] = (deficit_task, [])
+    tasks[f"{p}metrics"] = (metrics_task, [])
+    return tasks
+
+def _unprefixed(results, prefix):
+    return {name[len(prefix):]: res for name, res in results.items() if name.startswith(prefix)}
+
+def report_inputs(df, report_date, shift, on_task_done=None):
+    """Run the report task graph; returns ``{task name: result or exception}``."""
+    results, _ = task_graph.run(report_tasks(df, report_date, shift), on_task_done=on_task_done)
+    return results
+
+def figure_errors(results):
+    """``{line: exception}`` for the backend figures that failed."""
+    return {name.split(":", 1)[1]: res for name, res in results.items()
+            if name.startswith("figure:") and isinstance(res, Exception)}
+
+# =============== FULL REPORT ===============
+
+def _write_report(report_date, shift, inputs, out_path):
+    """Prompt → markdown → PDF from the task graph results; returns the PDF path."""
+    prod_issue = inputs["prod_issue"]
+    if isinstance(prod_issue, Exception):
+        raise RuntimeError(f"Manufacturing analysis failed: {prod_issue}") from prod_issue
+
+    user_prompt = prompts.prompt_generation(
+        prod_issue, inputs["deficit"], inputs["metrics"], report_date, shift)
+    md_report = utils.build_report_string(user_prompt)
+    if md_report.startswith("Failed to generate report string"):
+        raise RuntimeError(md_report)
+
+    saved_pdf = utils.pdf_creation(md_report, save_path=out_path)
+    if saved_pdf != out_path:
+        raise RuntimeError(saved_pdf)
+    logger.info("PDF report written -> %s", saved_pdf)
+    return out_path
+
+def generate_report(report_date, shift, out_path=None, df=None, on_progress=None):
+    """Generate the PDF report for a date / shift without any UI.
+
+    ``on_progress(fraction, message)`` is called as steps finish. Returns the
+    stored PDF path; raises when the analysis, markdown or PDF step fails.
+    """
+    out_path = out_path or report_path(report_date, shift)
+    progress = on_progress or (lambda fraction, message: None)
+    if df is None:
+        shared_data.refresh()
+        df = shared_data.cleaned_dataframe()
+
+    tasks = report_tasks(df, report_date, shift)
+    done = []
+
+    def task_done(name, _):
+        done.append(name)
+        progress(0.8 * len(done) / len(tasks), f"{name} done")
+
+    progress(0.0, "Rendering figures and analyses")
+    results, _ = task_graph.run(tasks, on_task_done=task_done)
+    for line, err in figure_errors(results).items():
+        logger.error("Plot gen failed for %s: %s", line, err)
+
+    progress(0.8, "Writing report")
+    _write_report(report_date, shift, results, out_path)
+    progress(1.0, "Report ready")
+    return out_path
+
+# =============== BATCH REPORTS ===============
+
+def report_cutoffs(start_date, end_date, shifts=("Day", "Night")):
+    """Every (date, shift) from ``start_date`` to ``end_date`` inclusive."""
+    return [(d.date(), s) for d in pd.date_range(start_date, end_date, freq="D") for s in shifts]
+
+def generate_reports(cutoffs, skip_existing=True, df=None, on_progress=None):
+    """Generate the reports for many (date, shift) cutoffs in one pass.
+
+    The cleaned data (``df``, or the current stored version) is loaded once.
+    All cutoffs share a single task graph, so the figures of every cutoff
+    render in parallel (stored only in the figure cache, not next to the
+    single-report plots), LLM calls overlap, and repeated prompts are served
+    from the LLM cache. Returns a summary with
+    ``reports`` ({"YYYY-MM-DD Shift": pdf path or error message}),
+    ``seconds`` and ``reports_per_minute``.
+    """
+    progress = on_progress or (lambda fraction, message: None)
+    t0 = time.perf_counter()
+    if df is None:
+        shared_data.refresh()
+        df = shared_data.cleaned_dataframe()
+
+    tasks, existing, labels = {}, {}, []
+    for report_date, shift in cutoffs:
+        label = f"{pd.to_datetime(report_date):%Y-%m-%d} {shift}"
+        labels.append(label)
+        out_path = report_path(report_date, shift)
+        if skip_existing and existing_report(out_path):
+            existing[label] = out_path
+            continue
+        prefix = f"{label}/"
+        # figures live only in the content-addressed figure cache
+        graph = report_tasks(df, report_date, shift,
+                             plot_paths=dict.fromkeys(BACKEND_PLOT_PATHS), prefix=prefix)
+        tasks.update(graph)
+
+        def write(r, report_date=report_date, shift=shift, prefix=prefix, out_path=out_path):
+            return _write_report(report_date, shift, _unprefixed(r, prefix), out_path)
+        deps = [f"{prefix}prod_issue", f"{prefix}deficit", f"{prefix}metrics"]
+        tasks[f"{prefix}report"] = (write, deps)
+
+    done = []
+
+    def task_done(name, _):
+        done.append(name)
+        progress(len(done) / len(tasks), f"{name} done")
+
+    results = {}
+    if tasks:
+        results, _ = task_graph.run(tasks, max_workers=config.report_batch_threads,
+                                    on_task_done=task_done)
+    outcomes = {}
+    for label in labels:
+        res = existing[label] if label in existing else results[f"{label}/report"]
+        outcomes[label] = str(res) if isinstance(res, Exception) else res
+
+    seconds = time.perf_counter() - t0
+    written = sum(1 for name in results if name.endswith("/report")
+                  and not isinstance(results[name], Exception))
+    rate = written / (seconds / 60) if seconds > 0 else 0.0
+    logger.info("Batch reports: %d written, %d requested in %.1fs (%.2f reports/minute).",
+                written, len(cutoffs), seconds, rate)
+    progress(1.0, "Batch finished")
+    return {"reports": outcomes, "seconds": seconds, "reports_per_minute": rate}
+
+if __name__ == "__main__":
+    import argparse
+    from modules.logger import init_logger
+
+    parser = argparse.ArgumentParser(description="Generate reports for every shift in a date range.")
+    parser.add_argument("--start", required=True, help="first report date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="last report date (YYYY-MM-DD)")
+    parser.add_argument("--shifts", nargs="+", default=["Day", "Night"])
+    parser.add_argument("--force", action="store_true", help="regenerate existing reports")
+    args = parser.parse_args()
+
+    init_logger(config.local_log_flag)
+    summary = generate_reports(report_cutoffs(args.start, args.end, args.shifts),
+                               skip_existing=not args.force)
+    for label, outcome in summary["reports"].items():
+        print(f"{label}: {outcome}")
+    print(f"{len(summary['reports'])} reports in {summary['seconds']:.1f}s "
+          f"({summary['reports_per_minute']:.2f} reports/minute)")
@@ -0,0 +1,75 @@
+# modules/schema.py
+
+import hashlib
+import numpy as np
+import pandas as pd
+import config
+from modules import gcs
+
+# Low-cardinality text columns of the cleaned dataset
+CATEGORICAL_COLUMNS = [
+    'Production Line',
+    'Shift',
+    'Raw Material Availability',
+    'Issue Severity',
+    'Issue Type',
+]
+
+def is_shortage(df):
+    """Boolean mask of shortage rows (uses the precomputed flag when present)."""
+    if 'is_shortage' in df.columns:
+        return df['is_shortage']
+    return df['Raw Material Availability'].astype(object).str.contains('Shortage', na=False)
+
+def has_issue(df):
+    """Boolean mask of rows that reported an issue (severity other than 'No Issue')."""
+    if 'has_issue' in df.columns:
+        return df['has_issue']
+    return df['Issue Severity'] != 'No Issue'
+
+def _downcast_numeric(s):
+    if pd.api.types.is_integer_dtype(s):
+        # int32 floor: narrower ints overflow silently in element-wise maths
+        info = np.iinfo('int32')
+        if s.empty or (s.min() >= info.min and s.max() <= info.max):
+            return s.astype('int32')
+        return s
+    if pd.api.types.is_float_dtype(s):
+        f32 = s.astype('float32')
+        # only when lossless – LP / report numbers must not drift
+        if f32.astype(s.dtype).equals(s):
+            return f32
+    return s
+
+def apply_schema(df):
+    """Assign compact dtypes and the boolean flags to a cleaned dataframe.
+
+    Text columns become categoricals, integer columns are downcast and float
+    columns are narrowed to float32 only when no value changes. Call on the
+    cleaned frame right after loading it.
+    """
+    df = df.copy()
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'])
+    if 'Raw Material Availability' in df.columns:
+        df['is_shortage'] = is_shortage(df).to_numpy(dtype=bool)
+    if 'Issue Severity' in df.columns:
+        df['has_issue'] = has_issue(df).to_numpy(dtype=bool)
+
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = _downcast_numeric(df[col])
+    return df
+
+def fingerprint(df):
+    """Stable content hash of a dataframe (values, column names and order)."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    h.update("|".join(map(str, df.columns)).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+def load_cleaned_dataframe(path=None):
+    """Load the cleaned dataset from storage with the compact schema applied."""
+    return apply_schema(gcs.load_dataframe(path or config.cleaned_path, config.local_data_flag))
@@ -0,0 +1,96 @@
+# modules/shared_data.py
+
+import logging
+import threading
+import time
+
+import config
+from modules import gcs, schema
+
+logger = logging.getLogger("manufacturing_logger")
+
+# One process-wide copy of the cleaned dataset, shared by every Streamlit
+# session. It is keyed by the storage version of the cleaned file. When a new
+# upload replaces that file, the entry and everything derived from it (figures,
+# lookup tables) are dropped together. Callers must treat the frame as
+# read-only and copy it before mutating.
+_lock = threading.Lock()
+_entry = None          # {"version", "df", "fingerprint", "derived", "build_locks"}
+_checked_at = 0.0
+
+def _stored_version():
+    return gcs.version(config.cleaned_path, config.local_data_flag)
+
+def _current():
+    global _entry, _checked_at
+    with _lock:
+        now = time.time()
+        if _entry is not None and now - _checked_at < config.shared_data_check_seconds:
+            return _entry
+
+        version = _stored_version()
+        _checked_at = now
+        if _entry is not None and _entry["version"] == version:
+            return _entry
+
+        if _entry is not None:
+            logger.info("Cleaned dataset superseded (%s → %s); evicting shared copy.",
+                        _entry["version"], version)
+        _entry = None   # release the old frame before loading the new one
+        df = schema.load_cleaned_dataframe()
+        _entry = {
+            "version": version,
+            "df": df,
+            "fingerprint": schema.fingerprint(df),
+            "derived": {},
+            "build_locks": {},
+        }
+        logger.info("Loaded shared cleaned dataset (version %s, %d rows).", version, len(df))
+        return _entry
+
+def cleaned_dataframe():
+    """The shared cleaned dataset for the stored version (read-only)."""
+    return _current()["df"]
+
+def data_key():
+    """Content fingerprint of the shared dataset, for keying derived caches."""
+    return _current()["fingerprint"]
+
+def version():
+    """Storage version of the shared dataset."""
+    return _current()["version"]
+
+def current():
+    """``(version, df)`` of the shared dataset, taken from the same entry."""
+    entry = _current()
+    return entry["version"], entry["df"]
+
+def refresh():
+    """Check the stored version on the next access instead of after shared_data_check_seconds."""
+    global _checked_at
+    with _lock:
+        _checked_at = 0.0
+
+def derived(key, build):
+    """Value of ``build(df)`` for the shared dataset, computed once per version.
+
+    ``key`` names the value (e.g. ``("figure", family, line)``); concurrent
+    sessions asking for the same key wait for a single build.
+    """
+    entry = _current()
+    cache = entry["derived"]
+    if key in cache:
+        return cache[key]
+    with _lock:
+        key_lock = entry["build_locks"].setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in cache:
+            cache[key] = build(entry["df"])
+        return cache[key]
+
+def invalidate():
+    """Drop the shared dataset; the next access reloads the stored version."""
+    global _entry, _checked_at
+    with _lock:
+        _entry = None
+        _checked_at = 0.0
@@ -0,0 +1,66 @@
+# modules/task_graph.py
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+logger = logging.getLogger("manufacturing_logger")
+
+def run(tasks, max_workers=None, on_task_done=None):
+    """Run a graph of tasks, each as soon as its dependencies have finished.
+
+    ``tasks`` maps a name to ``(fn, deps)``. ``fn`` is called with a dict of
+    its dependencies' results. A dependency that raised is passed as its
+    exception, so each task decides whether it can go on without it.
+
+    Returns ``(results, timings)``. ``results`` maps each name to the task's
+    return value or the exception it raised. ``timings`` maps each name to
+    ``(start, seconds)``, with ``start`` measured from the start of the run.
+    ``on_task_done(name, result)`` is called on the calling thread as each
+    task finishes.
+    The tasks run on threads. CPU-heavy work should hand off to processes
+    itself (see modules.parallel).
+    """
+    for name, (_, deps) in tasks.items():
+        missing = [d for d in deps if d not in tasks]
+        if missing:
+            raise ValueError(f"Task {name!r} depends on unknown task(s) {missing}")
+
+    t0 = time.perf_counter()
+    results, timings = {}, {}
+    pending = dict(tasks)
+    running = {}
+
+    def _call(name, fn, inputs):
+        start = time.perf_counter()
+        try:
+            return fn(inputs)
+        finally:
+            timings[name] = (start - t0, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(tasks))) as pool:
+        while pending or running:
+            ready = [n for n, (_, deps) in pending.items() if all(d in results for d in deps)]
+            for name in ready:
+                fn, deps = pending.pop(name)
+                inputs = {d: results[d] for d in deps}
+                running[pool.submit(_call, name, fn, inputs)] = name
+            if not running:
+                raise ValueError(f"Task graph has a cycle among {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                except Exception as e:
+                    logger.error("Task %s failed: %s", name, e)
+                    results[name] = e
+                if on_task_done is not None:
+                    on_task_done(name, results[name])
+
+    total = time.perf_counter() - t0
+    logger.info("Task graph finished in %.2fs: %s", total, ", ".join(
+        f"{n} {s:.2f}+{d:.2f}s" for n, (s, d) in sorted(timings.items(), key=lambda kv: kv[1][0])))
+    return results, timings
@@ -1,8 +1,11 @@
 # modules/utils.py   – full file with stronger logging + safer PDF upload
+import logging
 import os
 import sys
 import base64
+import threading
 from math import ceil
+from functools import lru_cache
 from datetime import datetime,timedelta
 
 import numpy as np
@@ -14,9 +17,9 @@ from openai import OpenAI
 from huggingface_hub import InferenceClient, login
 from xhtml2pdf import pisa
 
-from modules import prompts, gcs
+from modules import prompts, gcs, schema, llm_cache
 import config
-from modules.logger import get_log_stream, upload_log_to_gcs, get_logger
+from modules.logger import get_log_stream, upload_log_to_gcs
 
 from PIL import Image
 import google.generativeai as genai
@@ -28,7 +31,7 @@ import json
 # Logger
 # ─────────────────────────────────────────────
 load_dotenv()
-logger = get_logger()
+logger = logging.getLogger("manufacturing_logger")
 
 def _log_long(txt: str, label: str, head: int = 800) -> None:
     """
@@ -54,7 +57,7 @@ def encode_image(path: str) -> str:
         image_bytes = gcs.read_bytes(path, config.local_eda_flag)
         logger.info("Encoded image at %s", path)
         return (
-            "data:image/png;base64,"
+            f"data:{gcs.image_content_type(path)};base64,"
             + base64.b64encode(image_bytes).decode("utf-8")
         )
     except Exception as e:
@@ -64,91 +67,83 @@ def encode_image(path: str) -> str:
 # ─────────────────────────────────────────────
 # 1. Manufacturing analysis (plots → LLM)
 # ─────────────────────────────────────────────
-def generate_manufacturing_analysis() -> str:
-    """
-    Loop over the three combined EDA plots (one per line), send each to an LLM
-    and build a single markdown section containing all analyses.
-    """
-    try:
-        image_paths = [
-            config.line1_combined_analysis_path,
-            config.line2_combined_analysis_path,
-            config.line3_combined_analysis_path,
-        ]
-        titles = [
-            "Plot 1 : Line 1 Combined EDA",
-            "Plot 2 : Line 2 Combined EDA",
-            "Plot 3 : Line 3 Combined EDA",
-        ]
-        manufacturing_system_prompt = prompts.manufacturing_system_prompt
-        combined_md = ""
-
-        if config.USE_OPENAI:
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            logger.info("Using OpenAI for manufacturing analysis.")
+# line → (section title, stored combined figure)
+ANALYSIS_PLOTS = {
+    "Line1": ("Plot 1 : Line 1 Combined EDA", config.line1_combined_analysis_path),
+    "Line2": ("Plot 2 : Line 2 Combined EDA", config.line2_combined_analysis_path),
+    "Line3": ("Plot 3 : Line 3 Combined EDA", config.line3_combined_analysis_path),
+}
+
+# bounds concurrent LLM requests across threads (task-graph and batch runs)
+_llm_slots = threading.BoundedSemaphore(config.llm_max_concurrency)
+
+@lru_cache(maxsize=2)
+def _analysis_client(use_openai: bool):
+    if use_openai:
+        logger.info("Using OpenAI for manufacturing analysis.")
+        return OpenAI(api_key=OPENAI_API_KEY, timeout=config.llm_request_timeout)
+    login(HUGGINGFACE_API_KEY)
+    logger.info("Using HuggingFace for manufacturing analysis.")
+    return InferenceClient(config.huggingface_model,
+                           token=HUGGINGFACE_API_KEY,
+                           timeout=config.llm_request_timeout)
+
+def analyse_line_plot(line: str, path: str = None) -> str:
+    """Send one line's combined plot (default: its stored figure) to the LLM
+    and return its markdown analysis."""
+    title, default_path = ANALYSIS_PLOTS[line]
+    path = path or default_path
+    encoded = encode_image(gcs.profile_path(path, config.backend_plot_profile))
+    messages = [
+        {"role": "system", "content": prompts.manufacturing_system_prompt},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": title},
+                {"type": "image_url",
+                 "image_url": {"url": encoded}},
+            ],
+        },
+    ]
+    model = config.gpt_model if config.USE_OPENAI else config.huggingface_model
+    with _llm_slots:
+        analysis = llm_cache.chat_completion(_analysis_client(config.USE_OPENAI), model, messages)
+    _log_long(analysis, f"{title}-analysis")
+    logger.info("Analysis generated for %s", title)
+    return analysis
+
+def format_manufacturing_analysis(analyses: dict) -> str:
+    """Markdown section from ``{line: analysis or exception}``, in line order."""
+    combined_md = ""
+    for line, (title, _) in ANALYSIS_PLOTS.items():
+        if line not in analyses:
+            continue
+        analysis = analyses[line]
+        if isinstance(analysis, Exception):
+            logger.error("%s analysis failed: %s", title, analysis)
+            combined_md += f"\n\n### {title}\nAnalysis failed: {analysis}"
         else:
-            login(HUGGINGFACE_API_KEY)
-            client = InferenceClient(config.huggingface_model,
-                                     token=HUGGINGFACE_API_KEY)
-            logger.info("Using HuggingFace for manufacturing analysis.")
-
-        for title, path in zip(titles, image_paths):
-            try:
-                encoded = encode_image(path)
-                messages = [
-                    {"role": "system", "content": manufacturing_system_prompt},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": title},
-                            {"type": "image_url",
-                             "image_url": {"url": encoded}},
-                        ],
-                    },
-                ]
-                if config.USE_OPENAI:
-                    resp = client.chat.completions.create(
-                        model=config.gpt_model, messages=messages
-                    )
-                    analysis = resp.choices[0].message.content
-                else:
-                    resp = client.chat.completions.create(
-                        model=config.huggingface_model, messages=messages
-                    )
-                    analysis = resp.choices[0].message.content
-
-                _log_long(analysis, f"{title}-analysis")
-                combined_md += f"\n\n### {title}\n{analysis}"
-                logger.info("Analysis generated for %s", title)
-
-            except Exception as e:
-                logger.error("%s analysis failed: %s", title, e)
-                combined_md += f"\n\n### {title}\nAnalysis failed: {e}"
-
-        logger.info("Manufacturing analysis complete.")
-        return combined_md
-
-    except Exception as e:
-        logger.error("generate_manufacturing_analysis failed: %s", e)
-        raise
+            combined_md += f"\n\n### {title}\n{analysis}"
+    return combined_md
 
 # ─────────────────────────────────────────────
 # 2. Recovery plan (LP optimisation → text)
 # ─────────────────────────────────────────────
-def run_recovery_text_output(start_date, start_shift) -> str:
+def run_recovery_text_output(start_date, start_shift, df=None) -> str:
     """
     Optimise a deficit-recovery schedule.
-    Returns a plain-text block.
+    ``df`` is the cleaned data when the caller has it loaded already
+    (it is not modified). Returns a plain-text block.
     """
     try:
         # 1️⃣ Load & preprocess
-        df = gcs.load_dataframe(config.cleaned_path, config.local_data_flag)
-        df["Date"] = pd.to_datetime(df["Date"])
-        df["shift_time"] = np.where(
+        if df is None:
+            df = schema.load_cleaned_dataframe()
+        df = df.assign(shift_time=np.where(
             df["Shift"] == "Day",
             df["Date"] + pd.Timedelta(hours=12),
             df["Date"] + pd.Timedelta(hours=20),
-        )
+        ))
         df = df.sort_values("shift_time").reset_index(drop=True)
 
         # 2️⃣ Cut-off timestamp
@@ -163,13 +158,13 @@ def run_recovery_text_output(start_date, start_shift) -> str:
 
         D = window["Production_Deficit"].sum()
         # overall avg hours per LINE (both shifts combined—as before)
-        avg_line  = baseline.groupby("Production Line")["Machine Operation Time (hrs)"].mean()
-        rate_line = window.groupby("Production Line")["Production Rate (units/hr)"].mean()
+        avg_line  = baseline.groupby("Production Line", observed=True)["Machine Operation Time (hrs)"].mean()
+        rate_line = window.groupby("Production Line", observed=True)["Production Rate (units/hr)"].mean()
 
         # NEW: per-shift averages for the baseline period
         avg_by_shift = (
             baseline
-            .groupby(["Production Line","Shift"])["Machine Operation Time (hrs)"]
+            .groupby(["Production Line","Shift"], observed=True)["Machine Operation Time (hrs)"]
             .mean()
             .unstack()   # yields columns ['Day','Night']
         )
@@ -257,18 +252,40 @@ def build_report_string(prompt: str) -> str:
     """Call OpenAI with the full prompt and return the markdown report string."""
     try:
         client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model=config.gpt_model,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=0.0,
-        )
-        md = response.choices[0].message.content
+        with _llm_slots:
+            md = llm_cache.chat_completion(
+                client,
+                config.gpt_model,
+                [{"role": "system", "content": prompt}],
+                temperature=0.0,
+            )
         _log_long(md, "build_report_string-return")
         return md
     except Exception as e:
         logger.error("build_report_string failed: %s", e)
         return f"Failed to generate report string: {e}"
 
+def stream_report_string(prompt: str):
+    """Streaming build_report_string: yields the markdown report in chunks.
+
+    Raises if the stream fails, so a partial report never reaches the PDF.
+    """
+    parts = []
+    try:
+        client = OpenAI(api_key=OPENAI_API_KEY)
+        for delta in llm_cache.chat_completion_stream(
+            client,
+            config.gpt_model,
+            [{"role": "system", "content": prompt}],
+            temperature=0.0,
+        ):
+            parts.append(delta)
+            yield delta
+        _log_long("".join(parts), "stream_report_string-return")
+    except Exception as e:
+        logger.error("stream_report_string failed after %d chunks: %s", len(parts), e)
+        raise
+
 # ─────────────────────────────────────────────
 # 4. Convert markdown → PDF (local or GCS)
 # ─────────────────────────────────────────────
@@ -434,10 +451,12 @@ def full_text_from_report(report_path, is_local=True):
 
 
 ## ---> Final Production plan generation in a dataframe format
-def recovery_summary_and_plan_from_text(full_text, cleaned_csv_path, prod_rate_map=None,):
+def recovery_summary_and_plan_from_text(full_text, cleaned_csv_path, prod_rate_map=None, df=None):
     """
     1. Calls Gemini to extract recovery JSON from full_text.
     2. Generates summary DataFrame and production plan DataFrame.
+    ``df`` is the cleaned data if already loaded (read-only); otherwise it
+    is read from ``cleaned_csv_path``.
     Returns: summary_df, plan_df
     """
     if prod_rate_map is None:
@@ -446,12 +465,12 @@ def recovery_summary_and_plan_from_text(full_text, cleaned_csv_path, prod_rate_m
     # --- Gemini call for JSON extraction ---
     prompt = prompts.production_recovery_prompt(full_text)
     client = OpenAI(api_key=OPENAI_API_KEY)
-    response = client.chat.completions.create(
-        model=config.gpt_model,
-        messages=[{"role": "system", "content": prompt}],
+    content = llm_cache.chat_completion(
+        client,
+        config.gpt_model,
+        [{"role": "system", "content": prompt}],
         temperature=0.0,
-    )
-    content = response.choices[0].message.content.strip()
+    ).strip()
     match = re.search(r'(\[\s*{.*?}\s*\])', content, re.DOTALL)
     if match:
         json_str = match.group(1)
@@ -469,8 +488,7 @@ def recovery_summary_and_plan_from_text(full_text, cleaned_csv_path, prod_rate_m
 
     # --- DataFrame generation ---
     line_summary = pd.DataFrame(summary_list)
-    cleaned_df = gcs.load_dataframe(cleaned_csv_path, is_local=config.local_data_flag)
-    cleaned_df['Date'] = pd.to_datetime(cleaned_df['Date'])  # Ensures correct type
+    cleaned_df = df if df is not None else schema.load_cleaned_dataframe(cleaned_csv_path)
     last_date  = cleaned_df['Date'].max()
     last_shift = cleaned_df[cleaned_df['Date'] == last_date]['Shift'].iloc[-1]
 
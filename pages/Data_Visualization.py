@@ -1,9 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import config
 import logging
+from modules import schema, partitions, data_preprocessing, shared_data, downsampling
 
 
 # If using your own logger module:
@@ -20,212 +20,173 @@ st.set_page_config(page_title="Visualizations", page_icon="📊", layout="wide")
 st.title("📊 Manufacturing Analytics – Visualizations")
 
 # ──────────────────────────────────────────────
-# 1. Load / cache cleaned data
+# 1. Shared cleaned data
 # ──────────────────────────────────────────────
-@st.cache_data(show_spinner=False)
-def _read_cleaned(path: str) -> pd.DataFrame:
-    return pd.read_csv(path, parse_dates=["Date"])
-
-if "cleaned_df" in st.session_state:
-    df = st.session_state.cleaned_df.copy()
-else:
-    try:
-        df = _read_cleaned(config.cleaned_path)
-        st.session_state.cleaned_df = df.copy()
-        logger.info("Loaded cleaned data for visualization from %s", config.cleaned_path)
-    except Exception as e:
-        logger.error(f"Failed to load cleaned data: {e}")
-        st.error("❗ Please upload & preprocess data first on the **Data Loader** page.")
-        st.stop()
+try:
+    # process-wide copy shared by all sessions (read-only)
+    df = shared_data.cleaned_dataframe()
+except Exception as e:
+    logger.error(f"Failed to load cleaned data: {e}")
+    st.error("❗ Please upload & preprocess data first on the **Data Loader** page.")
+    st.stop()
 
 # ──────────────────────────────────────────────
-# 2. Build (once) & cache Plotly figures
+# 2. Figure builders – built on demand per (family, line)
 # ──────────────────────────────────────────────
-if "figs_all" not in st.session_state:
-    try:
-        figs_all = {
-            "util_ful": {},
-            "down_box": {},
-            "down_bar": {},
-            "down_heat": {},
-            "issues":   {},
-            "prod_vs_down": {},
-            "inv_short": {},
-            "shifts":   sorted(df["Shift"].unique()),
-        }
-
-        # convert categorical order for nicer plots
-        df["Shift"] = pd.Categorical(df["Shift"], ordered=True,
-                                    categories=sorted(df["Shift"].unique()))
-
-        # ----------------------------------------------------------
-        # A. Utilization vs Shift  +  Fulfillment over Time
-        # ----------------------------------------------------------
-        for line in df["Production Line"].unique():
-            try:
-                sub = df[df["Production Line"] == line].copy()
-                fig_util = px.box(
-                    sub, x="Shift", y="Utilization (%)",
-                    points="all",
-                    title=f"{line} • Utilization vs Shift",
-                    template="plotly_white"
-                )
-                fig_ful = px.line(
-                    sub.sort_values("Date"), x="Date", y="Fulfillment Rate (%)",
-                    markers=True,
-                    title=f"{line} • Fulfillment Rate over Time",
-                    template="plotly_white"
-                )
-                figs_all["util_ful"][line] = (fig_util, fig_ful)
-                logger.info(f"Created Utilization/Fulfillment plots for line {line}")
-            except Exception as e:
-                logger.error(f"Failed to plot Utilization/Fulfillment for {line}: {e}")
-
-        # ----------------------------------------------------------
-        # B. Downtime distribution (box, bar, heat)
-        # ----------------------------------------------------------
-        for line in df["Production Line"].unique():
-            try:
-                sub = df[df["Production Line"] == line]
-
-                # B1. Boxplot: Severity vs Downtime
-                fig_box = px.box(
-                    sub, x="Issue Severity", y="Total Downtime (hrs)",
-                    title=f"{line} • Severity vs Downtime",
-                    template="plotly_white",
-                    points="all"
-                )
-                figs_all["down_box"][line] = fig_box
-
-                # B2. Bar: downtime by Issue Type
-                down_by_type = (
-                    sub.groupby("Issue Type")["Total Downtime (hrs)"]
-                    .sum().sort_values(ascending=False)
-                    .reset_index()
-                )
-                fig_bar = px.bar(
-                    down_by_type, x="Issue Type", y="Total Downtime (hrs)",
-                    title=f"{line} • Total Downtime by Issue Type",
-                    template="plotly_white"
-                )
-                figs_all["down_bar"][line] = fig_bar
-
-                # B3. Heat-map: Shift × Issue Type
-                pivot = (sub.pivot_table(index="Shift", columns="Issue Type",
-                                         values="Total Downtime (hrs)",
-                                         aggfunc="sum", fill_value=0)
-                              .reindex(index=figs_all["shifts"]))
-                fig_heat = px.imshow(
-                    pivot,
-                    labels=dict(color="Downtime (hrs)"),
-                    title=f"{line} • Shift vs Issue Type Downtime",
-                    aspect="auto",
-                    template="plotly_white",
-                    color_continuous_scale="YlOrRd"
-                )
-                figs_all["down_heat"][line] = fig_heat
-                logger.info(f"Created downtime plots for line {line}")
-            except Exception as e:
-                logger.error(f"Failed to create downtime plots for {line}: {e}")
-
-        # ----------------------------------------------------------
-        # C. Issue timelines (bubble)
-        # ----------------------------------------------------------
-        try:
-            issues_df = df[df["Issue Severity"] != "No Issue"].copy()
-            issues_df["Bubble"] = issues_df["Downtime - Issues (hrs)"] * 100
-
-            for line in issues_df["Production Line"].unique():
-                sub = issues_df[issues_df["Production Line"] == line]
-                fig_iss = px.scatter(
-                    sub, x="Date", y="Issue Type", size="Bubble", color="Issue Type",
-                    title=f"{line} • Issue Timeline",
-                    template="plotly_white",
-                    size_max=30,
-                )
-                figs_all["issues"][line] = fig_iss
-            logger.info("Created issue timelines (bubble) plots.")
-        except Exception as e:
-            logger.error(f"Failed to create issue timeline plots: {e}")
-
-        # ----------------------------------------------------------
-        # D. Production vs Downtime (per shift)
-        # ----------------------------------------------------------
-        try:
-            df["Date"] = pd.to_datetime(df["Date"])
-            agg = (df.groupby(["Date", "Production Line", "Shift"], as_index=False)
-                     .agg(Prod_time=("Machine Operation Time (hrs)", "sum"),
-                          Downtime=("Total Downtime (hrs)", "sum")))
-
-            for line in agg["Production Line"].unique():
-                figs_all["prod_vs_down"][line] = {}
-                for shift in figs_all["shifts"]:
-                    sub = agg[(agg["Production Line"] == line) & (agg["Shift"] == shift)]
-                    if sub.empty:
-                        continue
-                    fig_ts = go.Figure()
-                    fig_ts.add_scatter(
-                        x=sub["Date"], y=sub["Prod_time"],
-                        mode="lines+markers", name="Production Time (hrs)")
-                    fig_ts.add_bar(
-                        x=sub["Date"], y=sub["Downtime"],
-                        name="Total Downtime (hrs)", opacity=0.5)
-                    fig_ts.update_layout(
-                        template="plotly_white",
-                        title=f"{line} • {shift} – Production vs Downtime")
-                    figs_all["prod_vs_down"][line][shift] = fig_ts
-            logger.info("Created Production vs Downtime plots.")
-        except Exception as e:
-            logger.error(f"Failed to create Production vs Downtime plots: {e}")
-
-        # ----------------------------------------------------------
-        # E. Inventory, Production & Shortages
-        # ----------------------------------------------------------
-        for line in df["Production Line"].unique():
-            try:
-                sub = df[df["Production Line"] == line].sort_values("Date")
-                fig_inv = go.Figure()
-
-                fig_inv.add_scatter(
-                    x=sub["Date"], y=sub["Raw Material Inventory"],
-                    mode="lines", name="Inventory", line=dict(color="blue"))
-                fig_inv.add_scatter(
-                    x=sub["Date"], y=sub["Downtime - Raw Material (hrs)"] * 1000,
-                    mode="lines", name="Downtime (hrs, scaled)",
-                    line=dict(color="red", dash="dash"))
-
-                fig_inv.add_scatter(
-                    x=sub["Date"], y=sub["Actual Production (units)"],
-                    mode="lines", name="Actual Production", yaxis="y2",
-                    line=dict(color="green"))
-
-                # shortages
-                shortage = sub[sub["Raw Material Availability"].str.contains("Shortage", na=False)]
-                fig_inv.add_scatter(
-                    x=shortage["Date"], y=shortage["Actual Production (units)"],
-                    mode="markers", name="Shortage", yaxis="y2",
-                    marker=dict(color="orange", symbol="x", size=10))
-
-                fig_inv.update_layout(
-                    template="plotly_white",
-                    title=f"{line} • Inventory & Shortages",
-                    yaxis=dict(title="Inventory / Downtime (hrs scaled)"),
-                    yaxis2=dict(title="Actual Production (units)", overlaying="y", side="right")
-                )
-                figs_all["inv_short"][line] = fig_inv
-                logger.info(f"Created inventory & shortage plots for line {line}")
-            except Exception as e:
-                logger.error(f"Failed to create inventory & shortage plots for {line}: {e}")
-
-        st.session_state.figs_all = figs_all
-        logger.info("All plots generated and cached in session state.")
-    except Exception as e:
-        logger.error(f"Error during plot building and caching: {e}")
-        st.error("Failed to build visualization plots.")
+# Results are kept in the shared data layer for the current dataset version,
+# so every session reuses them and they are evicted with the data.
+def _shifts_and_lines(df):
+    return sorted(df["Shift"].unique()), sorted(df["Production Line"].unique())
+
+def _line_rows(df, line):
+    return partitions.rows(df, "Production Line", line)
+
+# A. Utilization vs Shift  +  Fulfillment over Time
+def util_ful_figures(df, line):
+    sub = _line_rows(df, line)
+    shifts, _ = shared_data.derived("shifts_and_lines", _shifts_and_lines)
+    fig_util = px.box(
+        sub, x="Shift", y="Utilization (%)",
+        points=downsampling.box_points(len(sub)),
+        category_orders={"Shift": shifts},
+        title=f"{line} • Utilization vs Shift",
+        template="plotly_white"
+    )
+    fig_ful = px.line(
+        downsampling.downsample(sub.sort_values("Date"), "Fulfillment Rate (%)"),
+        x="Date", y="Fulfillment Rate (%)",
+        markers=True,
+        title=f"{line} • Fulfillment Rate over Time",
+        template="plotly_white"
+    )
+    logger.info(f"Created Utilization/Fulfillment plots for line {line}")
+    return fig_util, fig_ful
+
+# B. Downtime distribution (box, bar, heat)
+def downtime_figures(df, line):
+    sub = _line_rows(df, line)
+    shifts, _ = shared_data.derived("shifts_and_lines", _shifts_and_lines)
+    downtime_agg, _ = shared_data.derived("dashboard_aggregates", data_preprocessing.load_dashboard_aggregates)
+
+    # B1. Boxplot: Severity vs Downtime
+    fig_box = px.box(
+        sub, x="Issue Severity", y="Total Downtime (hrs)",
+        title=f"{line} • Severity vs Downtime",
+        template="plotly_white",
+        points=downsampling.box_points(len(sub))
+    )
+
+    # B2. Bar: downtime by Issue Type
+    line_downtime = downtime_agg[downtime_agg["Production Line"] == line]
+    down_by_type = (
+        line_downtime.groupby("Issue Type", observed=True)["Total Downtime (hrs)"]
+        .sum().sort_values(ascending=False)
+        .reset_index()
+    )
+    fig_bar = px.bar(
+        down_by_type, x="Issue Type", y="Total Downtime (hrs)",
+        title=f"{line} • Total Downtime by Issue Type",
+        template="plotly_white"
+    )
+
+    # B3. Heat-map: Shift × Issue Type
+    pivot = (line_downtime.pivot_table(index="Shift", columns="Issue Type",
+                                       values="Total Downtime (hrs)",
+                                       aggfunc="sum", fill_value=0, observed=True)
+                          .reindex(index=shifts, fill_value=0))
+    fig_heat = px.imshow(
+        pivot,
+        labels=dict(color="Downtime (hrs)"),
+        title=f"{line} • Shift vs Issue Type Downtime",
+        aspect="auto",
+        template="plotly_white",
+        color_continuous_scale="YlOrRd"
+    )
+    logger.info(f"Created downtime plots for line {line}")
+    return fig_box, fig_bar, fig_heat
+
+# C. Issue timelines (bubble)
+def issue_timeline_figure(df, line):
+    sub = _line_rows(df, line)
+    sub = sub[schema.has_issue(sub)].copy()
+    if sub.empty:
+        return None
+    sub["Bubble"] = sub["Downtime - Issues (hrs)"] * 100
+    fig_iss = px.scatter(
+        sub, x="Date", y="Issue Type", size="Bubble", color="Issue Type",
+        title=f"{line} • Issue Timeline",
+        template="plotly_white",
+        size_max=30,
+    )
+    logger.info(f"Created issue timeline plot for line {line}")
+    return fig_iss
+
+# D. Production vs Downtime (per shift)
+def prod_vs_down_figures(df, line):
+    shifts, _ = shared_data.derived("shifts_and_lines", _shifts_and_lines)
+    _, agg = shared_data.derived("dashboard_aggregates", data_preprocessing.load_dashboard_aggregates)
+    line_agg = agg[agg["Production Line"] == line]
+
+    figs = {}
+    for shift in shifts:
+        sub = line_agg[line_agg["Shift"] == shift]
+        if sub.empty:
+            continue
+        fig_ts = go.Figure()
+        fig_ts.add_trace(downsampling.scatter(
+            x=sub["Date"], y=sub["Prod_time"],
+            mode="lines+markers", name="Production Time (hrs)"))
+        fig_ts.add_bar(
+            x=sub["Date"], y=sub["Downtime"],
+            name="Total Downtime (hrs)", opacity=0.5)
+        fig_ts.update_layout(
+            template="plotly_white",
+            title=f"{line} • {shift} – Production vs Downtime")
+        figs[shift] = fig_ts
+    logger.info(f"Created Production vs Downtime plots for line {line}")
+    return figs
+
+# E. Inventory, Production & Shortages
+def inventory_figure(df, line):
+    sub = _line_rows(df, line).sort_values("Date")
+    fig_inv = go.Figure()
+
+    # long series are downsampled / drawn with WebGL
+    fig_inv.add_trace(downsampling.scatter(
+        x=sub["Date"], y=sub["Raw Material Inventory"],
+        mode="lines", name="Inventory", line=dict(color="blue")))
+    fig_inv.add_trace(downsampling.scatter(
+        x=sub["Date"], y=sub["Downtime - Raw Material (hrs)"] * 1000,
+        mode="lines", name="Downtime (hrs, scaled)",
+        line=dict(color="red", dash="dash")))
+
+    fig_inv.add_trace(downsampling.scatter(
+        x=sub["Date"], y=sub["Actual Production (units)"],
+        mode="lines", name="Actual Production", yaxis="y2",
+        line=dict(color="green")))
+
+    # shortages (markers are never downsampled)
+    shortage = sub[schema.is_shortage(sub)]
+    fig_inv.add_trace(downsampling.scatter(
+        x=shortage["Date"], y=shortage["Actual Production (units)"],
+        mode="markers", name="Shortage", yaxis="y2",
+        marker=dict(color="orange", symbol="x", size=10)))
+
+    fig_inv.update_layout(
+        template="plotly_white",
+        title=f"{line} • Inventory & Shortages",
+        yaxis=dict(title="Inventory / Downtime (hrs scaled)"),
+        yaxis2=dict(title="Actual Production (units)", overlaying="y", side="right")
+    )
+    logger.info(f"Created inventory & shortage plots for line {line}")
+    return fig_inv
 
-# shorthand
-figs = st.session_state.figs_all
-shifts = figs["shifts"]
+try:
+    shifts, line_list = shared_data.derived("shifts_and_lines", _shifts_and_lines)
+except Exception as e:
+    logger.error(f"Failed to read shifts / lines: {e}")
+    st.error("Failed to build visualization plots.")
+    st.stop()
 
 # ──────────────────────────────────────────────
 # 3. Sidebar navigation
@@ -243,7 +204,6 @@ try:
     )
 
     # optional filter by production line
-    line_list = sorted(df["Production Line"].unique())
     line_filter = st.sidebar.multiselect(
         "Filter by Production Line (blank = all)",
         options=line_list,
@@ -255,24 +215,23 @@ except Exception as e:
     st.error("Error setting up sidebar/filter options.")
 
 # ──────────────────────────────────────────────
-# 4. Render chosen family
+# 4. Render chosen family (only its figures are built)
 # ──────────────────────────────────────────────
-def show_line_pairs(pairs_dict):
+def build(builder, line):
     try:
-        for line, figs_pair in pairs_dict.items():
-            if line not in line_filter:
-                continue
-            for fig in figs_pair if isinstance(figs_pair, tuple) else figs_pair:
-                st.plotly_chart(fig, use_container_width=True)
-        logger.info(f"Plotted line pairs for chosen category.")
+        return shared_data.derived(("figure", builder.__name__, line), lambda df: builder(df, line))
     except Exception as e:
-        logger.error(f"Error plotting line pairs: {e}")
+        logger.error(f"Failed to create {builder.__name__} for {line}: {e}")
+        st.error(f"Failed to build {line} plots.")
+        return None
 
 try:
     if choice == "Utilization & Fulfillment":
-        for line, (fig_u, fig_f) in figs["util_ful"].items():
-            if line not in line_filter:
+        for line in line_filter:
+            figs_pair = build(util_ful_figures, line)
+            if figs_pair is None:
                 continue
+            fig_u, fig_f = figs_pair
             c1, c2 = st.columns(2)
             c1.plotly_chart(fig_u, use_container_width=True)
             c2.plotly_chart(fig_f, use_container_width=True)
@@ -280,29 +239,31 @@ try:
 
     elif choice == "Downtime distribution":
         for line in line_filter:
-            if line not in figs["down_box"]:
+            figs_line = build(downtime_figures, line)
+            if figs_line is None:
                 continue
             st.subheader(f"Line: {line}")
             c1, c2, c3 = st.columns(3)
-            c1.plotly_chart(figs["down_box"][line], use_container_width=True)
-            c2.plotly_chart(figs["down_bar"][line], use_container_width=True)
-            c3.plotly_chart(figs["down_heat"][line], use_container_width=True)
+            for col, fig in zip((c1, c2, c3), figs_line):
+                col.plotly_chart(fig, use_container_width=True)
         logger.info("Rendered Downtime Distribution charts.")
 
     elif choice == "Issue timelines":
         for line in line_filter:
-            if line in figs["issues"]:
-                st.plotly_chart(figs["issues"][line], use_container_width=True)
+            fig = build(issue_timeline_figure, line)
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
         logger.info("Rendered Issue Timelines charts.")
 
     elif choice == "Production vs Downtime":
         for line in line_filter:
-            if line not in figs["prod_vs_down"]:
+            figs_line = build(prod_vs_down_figures, line)
+            if not figs_line:
                 continue
             st.subheader(f"Line: {line}")
             cols = st.columns(len(shifts))
             for idx, shift in enumerate(shifts):
-                fig = figs["prod_vs_down"][line].get(shift)
+                fig = figs_line.get(shift)
                 if fig:
                     cols[idx].plotly_chart(fig, use_container_width=True)
                 else:
@@ -311,8 +272,9 @@ try:
 
     else:  # Inventory & Shortages
         for line in line_filter:
-            if line in figs["inv_short"]:
-                st.plotly_chart(figs["inv_short"][line], use_container_width=True)
+            fig = build(inventory_figure, line)
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
         logger.info("Rendered Inventory & Shortages charts.")
 
     st.sidebar.success("Navigate with the sidebar – all plots stay cached! 🚀")
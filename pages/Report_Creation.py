@@ -8,7 +8,7 @@ from streamlit_pdf_viewer import pdf_viewer
 import pandas as pd
 import logging
 
-from modules import utils, EDA_backend, prompts, gcs
+from modules import utils, prompts, gcs, shared_data, report, jobs
 import config
 from modules.logger import (
     init_logger,
@@ -46,6 +46,13 @@ try:
         with c2:
             shift = st.selectbox("Select Shift", ["Day", "Night"])
 
+        background = st.checkbox(
+            "Generate in the background (keeps running if you leave the page)",
+            value=config.report_background_jobs,
+            help="Background reports are not streamed to the page; untick to "
+                 "watch the report text as it is written.",
+        )
+
         st.session_state.setdefault("report_generated", False)
         st.session_state.setdefault("report_path", None)
 
@@ -53,82 +60,67 @@ try:
             try:
                 with st.spinner("Working…"):
                     safe_date = report_date.strftime("%Y-%m-%d")
-                    out_path = f"Reports_Created/Report_{safe_date}_{shift}.pdf"
+                    out_path = report.report_path(report_date, shift)
                     logger.info("Report generation triggered for %s %s -> %s",
                                 safe_date, shift, out_path)
 
                     # ✅ Use existing local report if allowed
-                    if config.local_report_flag and os.path.exists(out_path):
+                    if report.existing_report(out_path):
                         st.session_state.update(report_path=out_path,
                                                 report_generated=True)
                         st.toast("✔️ Re-using existing PDF", icon="📄")
                         logger.info("Re-used existing local report at %s", out_path)
 
+                    elif background:
+                        # worker process generates it; the status panel below polls
+                        # the data version makes a re-upload a different job
+                        job = jobs.submit("report", {"date": safe_date, "shift": shift,
+                                                     "data": shared_data.version()})
+                        st.session_state.update(report_job=job, report_generated=False)
+                        logger.info("Report job %s submitted.", job)
+
                     else:
                         # 1️⃣ Load cleaned data
                         try:
-                            df = gcs.load_dataframe(
-                                config.cleaned_path, config.local_data_flag)
-                            lines = df["Production Line"].dropna().unique()
+                            df = shared_data.cleaned_dataframe()
                             logger.info("Loaded cleaned data for report.")
                         except Exception as e:
                             logger.error("Failed to load cleaned data: %s", e)
                             st.error("Error loading cleaned data.")
                             st.stop()
 
-                        # 2️⃣ Save backend plots
-                        paths = {
-                            "Line1": config.line1_combined_analysis_path,
-                            "Line2": config.line2_combined_analysis_path,
-                            "Line3": config.line3_combined_analysis_path,
-                        }
-                        for line in lines:
-                            if line in paths:
-                                try:
-                                    EDA_backend.create_combined_linewise_figure(
-                                        df=df,
-                                        line=line,
-                                        save_path=paths[line],
-                                        date=safe_date,
-                                        shift=shift,
-                                    )
-                                    logger.info("Backend plot saved -> %s", paths[line])
-                                except Exception as e:
-                                    logger.error("Plot gen failed for %s: %s", line, e)
-                                    st.error(f"Error generating plot for {line}")
-
-                        # 3️⃣ Generate report components
-                        try:
-                            prod_issue = utils.generate_manufacturing_analysis()
-                            _log_long(prod_issue, "prod_issue")
-                        except Exception as e:
-                            logger.error("Manufacturing analysis gen failed: %s", e)
+                        # 2️⃣ Plots, per-line analyses, LP plan and metrics
+                        # (a task graph: independent steps run concurrently)
+                        results = report.report_inputs(df, report_date, shift)
+                        for line, err in report.figure_errors(results).items():
+                            logger.error("Plot gen failed for %s: %s", line, err)
+                            st.error(f"Error generating plot for {line}")
+
+                        # 3️⃣ Report components
+                        prod_issue = results["prod_issue"]
+                        if isinstance(prod_issue, Exception):
+                            logger.error("Manufacturing analysis gen failed: %s", prod_issue)
                             st.error("Failed to generate manufacturing analysis.")
                             st.stop()
-
-                        try:
-                            deficit = utils.run_recovery_text_output(report_date, shift)
-                            _log_long(deficit, "deficit")
-                        except Exception as e:
-                            logger.error("Deficit plan gen failed: %s", e)
-                            deficit = "Deficit plan generation failed."
-
-                        try:
-                            metrics_df = gcs.load_dataframe(
-                                config.linewise_pivot_data_filepath,
-                                config.local_data_flag,
-                            )
-                            metrics = metrics_df.to_string()
-                            _log_long(metrics, "metrics")
-                        except Exception as e:
-                            logger.error("Failed to load metrics: %s", e)
-                            metrics = "Failed to load metrics."
+                        deficit, metrics = results["deficit"], results["metrics"]
+                        _log_long(prod_issue, "prod_issue")
+                        _log_long(deficit, "deficit")
+                        _log_long(metrics, "metrics")
 
                         try:
                             user_prompt = prompts.prompt_generation(
                                 prod_issue, deficit, metrics, report_date, shift)
                             _log_long(user_prompt, "full_prompt_to_LLM")
-                            md_report = utils.build_report_string(user_prompt)
+                            if config.stream_report:
+                                # show the report while it is generated; the
+                                # PDF is only built once it is complete
+                                st.subheader("📝 Report draft")
+                                md_report = st.write_stream(
+                                    utils.stream_report_string(user_prompt))
+                            else:
+                                md_report = utils.build_report_string(user_prompt)
+                                if md_report.startswith("Failed to generate report string"):
+                                    raise RuntimeError(md_report)
                             _log_long(md_report, "md_report (pre-PDF)")
                             
                         except Exception as e:
@@ -147,8 +139,9 @@ try:
                             st.error("PDF creation failed.")
                             st.stop()
 
-                st.success("Report ready!")
-                logger.info("Report generation completed (%s %s).", safe_date, shift)
+                if not st.session_state.get("report_job"):
+                    st.success("Report ready!")
+                    logger.info("Report generation completed (%s %s).", safe_date, shift)
 
             except Exception as e:
                 logger.error("Report generation failed: %s", e)
@@ -158,6 +151,92 @@ except Exception as e:
     logger.error("Parameter section failed: %s", e)
     st.error("Failed to set report parameters.")
 
+# ─────────────────────────────────────────────
+# Background job status (polled until the PDF is ready)
+# ─────────────────────────────────────────────
+@st.fragment(run_every=config.report_job_poll_seconds)
+def report_job_status():
+    job = jobs.get(st.session_state.report_job)
+    if job is None or job["status"] == "failed":
+        error = job["error"] if job else "job not found"
+        logger.error("Report job %s failed: %s", st.session_state.report_job, error)
+        st.error(f"Report generation failed: {error}")
+        del st.session_state["report_job"]
+    elif job["status"] == "done":
+        st.session_state.update(report_path=job["result"], report_generated=True)
+        del st.session_state["report_job"]
+        logger.info("Report job finished -> %s", job["result"])
+        st.rerun()
+    else:
+        jobs.ensure_workers()
+        st.progress(job["progress"], text=f"Generating report in the background – {job['message']}")
+
+try:
+    if st.session_state.get("report_job"):
+        report_job_status()
+except Exception as e:
+    logger.error("Report job status failed: %s", e)
+    st.error("Failed to check report job status.")
+
+# ─────────────────────────────────────────────
+# Batch reports over a date / shift range
+# ─────────────────────────────────────────────
+def _show_batch_summary(summary):
+    st.success(f"{len(summary['reports'])} reports in {summary['seconds']:.0f}s "
+               f"({summary['reports_per_minute']:.2f} reports/minute)")
+    st.dataframe(pd.DataFrame(summary["reports"].items(), columns=["Report", "PDF / error"]),
+                 use_container_width=True)
+
+try:
+    with st.expander("📚 Batch Reports"):
+        today = date.today()
+        batch_range = st.date_input("Report dates", (today, today), key="batch_range")
+        batch_shifts = st.multiselect("Shifts", ["Day", "Night"], default=["Day", "Night"])
+        batch_force = st.checkbox("Regenerate existing reports", value=False)
+
+        if st.button("📚 Generate batch") and len(batch_range) == 2 and batch_shifts:
+            start, end = (d.strftime("%Y-%m-%d") for d in batch_range)
+            if background:
+                job = jobs.submit("report_batch", {
+                    "start": start, "end": end, "shifts": batch_shifts,
+                    "force": batch_force, "data": shared_data.version()})
+                st.session_state.batch_job = job
+                logger.info("Batch report job %s submitted (%s – %s).", job, start, end)
+            else:
+                with st.spinner("Generating reports…"):
+                    st.session_state.batch_summary = report.generate_reports(
+                        report.report_cutoffs(start, end, batch_shifts),
+                        skip_existing=not batch_force)
+
+        if st.session_state.get("batch_summary"):
+            _show_batch_summary(st.session_state.batch_summary)
+except Exception as e:
+    logger.error("Batch report generation failed: %s", e)
+    st.error(f"Batch report generation failed: {e}")
+
+@st.fragment(run_every=config.report_job_poll_seconds)
+def batch_job_status():
+    job = jobs.get(st.session_state.batch_job)
+    if job is None or job["status"] == "failed":
+        error = job["error"] if job else "job not found"
+        logger.error("Batch report job %s failed: %s", st.session_state.batch_job, error)
+        st.error(f"Batch report generation failed: {error}")
+        del st.session_state["batch_job"]
+    elif job["status"] == "done":
+        st.session_state.batch_summary = job["result"]
+        del st.session_state["batch_job"]
+        st.rerun()
+    else:
+        jobs.ensure_workers()
+        st.progress(job["progress"], text=f"Generating batch in the background – {job['message']}")
+
+try:
+    if st.session_state.get("batch_job"):
+        batch_job_status()
+except Exception as e:
+    logger.error("Batch job status failed: %s", e)
+    st.error("Failed to check batch job status.")
+
 # ─────────────────────────────────────────────
 # 2️⃣ Show PDF viewer + Download
 # ─────────────────────────────────────────────
@@ -211,7 +290,8 @@ try:
         # 2️⃣ Generate production plan
         line_summary, production_plan = utils.recovery_summary_and_plan_from_text(
             full_text,
-            config.cleaned_path
+            config.cleaned_path,
+            df=shared_data.cleaned_dataframe(),
         )
         logger.info(
             "Generated production plan: %d rows for %d lines",
@@ -0,0 +1,24 @@
+# tests/test_metrics.py
+
+import pandas as pd
+
+from modules.data_preprocessing import generate_unit_metrics, metrics_to_matrix, unit_metrics_matrix
+
+def test_unit_metrics_matrix_matches_nested_metrics():
+    df = pd.DataFrame({
+        'Production Line': ['Line1', 'Line1', 'Line2', 'Line2', 'Line3'],
+        'Actual Production (units)': [120, 80, 0, 0, 310],
+        'Total Downtime (hrs)': [1.5, 0.0, 4.0, 2.5, 0.25],
+        'Downtime - Raw Material (hrs)': [1.0, 0.0, 3.0, 0.5, 0.0],
+        'Downtime - Issues (hrs)': [0.5, 0.0, 1.0, 2.0, 0.25],
+        'Raw Material Inventory': [400, 350, 90, 60, 500],
+        'Raw Material Availability': ['Sufficient', 'Shortage', 'Shortage', 'Partial Shortage', 'Sufficient'],
+        'Utilization (%)': [88.0, 75.5, 20.0, 35.0, 95.0],
+        'Fulfillment Rate (%)': [96.0, 80.0, 0.0, 0.0, 101.0],
+    })
+
+    pd.testing.assert_frame_equal(
+        unit_metrics_matrix(df),
+        metrics_to_matrix(generate_unit_metrics(df)),
+        check_dtype=False,
+    )